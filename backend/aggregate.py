@@ -0,0 +1,404 @@
+"""
+One-pass aggregation of persona responses
+"""
+import math
+from typing import Optional, List, Dict, Any, Tuple
+
+from registry import age_band
+
+Z_95 = 1.96
+SAMPLE_RESPONSES = 10
+# Always reported for scale questions, as by_state / by_lifestyle
+DEFAULT_SEGMENTS = {"state_primary": "by_state", "lifestyle": "by_lifestyle"}
+SEGMENT_LABELS = {"state_primary": "state", "lifestyle": "lifestyle"}
+
+
+def persona_attribute(persona: dict, attr: str) -> Any:
+    if attr == "age_band":
+        return age_band(persona["age"])
+    return persona.get(attr)
+
+
+def parse_score(response: dict) -> Optional[int]:
+    """Score as an int in 1..10, or None if missing or unparseable"""
+    value = response.get("score")
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        score = int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+    return score if 1 <= score <= 10 else None
+
+
+class RunningStats:
+    """Count, mean and variance via Welford's algorithm"""
+
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def ci95(self) -> Tuple[float, float]:
+        if self.n == 0:
+            return (0.0, 0.0)
+        half = Z_95 * self.std / math.sqrt(self.n)
+        return (self.mean - half, self.mean + half)
+
+
+def _pct(count: int, total: int) -> float:
+    return round(count / total * 100, 1) if total else 0.0
+
+
+def _proportion_ci(count: int, total: int) -> List[float]:
+    if not total:
+        return [0.0, 0.0]
+    p = count / total
+    half = Z_95 * math.sqrt(p * (1 - p) / total)
+    return [round(max(0.0, p - half) * 100, 1), round(min(1.0, p + half) * 100, 1)]
+
+
+class ResponseAggregator:
+    """Incremental aggregate over (response, persona) pairs.
+
+    Memory is O(segments), independent of the number of responses (apart
+    from a fixed-size sample). result() can be called at any point, so the
+    same object serves final results, streaming updates and job progress.
+    crosstab lists extra persona attributes (e.g. "gender", "city",
+    "age_band") to break results down by.
+    """
+
+    def __init__(self, question_type: str = "scale", crosstab: Optional[List[str]] = None,
+                 sample_size: int = SAMPLE_RESPONSES):
+        self.question_type = question_type
+        self.crosstab = [a for a in (crosstab or []) if a not in DEFAULT_SEGMENTS]
+        self.sample_size = sample_size
+        self.total = 0
+        self.sample: List[dict] = []
+        # llm / cached / simulated, so a test that silently fell back is visible
+        self.sources: Dict[str, int] = {}
+        self.fallbacks: Dict[str, int] = {}
+
+        # scale
+        self.overall = RunningStats()
+        self.distribution = [0] * 10
+        self.unparsed = 0
+        self.segments: Dict[str, Dict[Any, RunningStats]] = {}
+        # choice
+        self.choice_counts: Dict[Any, int] = {}
+        self.choice_segments: Dict[str, Dict[Any, Dict[Any, int]]] = {}
+
+        for attr in list(DEFAULT_SEGMENTS) + self.crosstab:
+            self.segments[attr] = {}
+        for attr in self.crosstab:
+            self.choice_segments[attr] = {}
+
+    def add(self, response: dict, persona: dict):
+        self.total += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(response)
+        source = response.get("source", "unknown")
+        self.sources[source] = self.sources.get(source, 0) + 1
+        reason = response.get("fallback_reason")
+        if reason:
+            self.fallbacks[reason] = self.fallbacks.get(reason, 0) + 1
+
+        if self.question_type == "scale":
+            score = parse_score(response)
+            if score is None:
+                self.unparsed += 1
+                return
+            self.overall.add(score)
+            self.distribution[score - 1] += 1
+            for attr, groups in self.segments.items():
+                value = persona_attribute(persona, attr)
+                stats = groups.get(value)
+                if stats is None:
+                    stats = groups[value] = RunningStats()
+                stats.add(score)
+        else:
+            choice = response.get("choice_text", response.get("choice", "Unknown"))
+            self.choice_counts[choice] = self.choice_counts.get(choice, 0) + 1
+            for attr, groups in self.choice_segments.items():
+                value = persona_attribute(persona, attr)
+                counts = groups.setdefault(value, {})
+                counts[choice] = counts.get(choice, 0) + 1
+
+    def result(self, include_sample: bool = True) -> Dict[str, Any]:
+        if self.question_type == "scale":
+            results = self._scale_result()
+        else:
+            results = self._choice_result()
+        results["sources"] = dict(self.sources)
+        if self.fallbacks:
+            results["fallbacks"] = dict(self.fallbacks)
+        if include_sample:
+            results["responses"] = list(self.sample)
+        return results
+
+    def _scale_result(self) -> Dict[str, Any]:
+        scored = self.overall.n
+        lo, hi = self.overall.ci95()
+
+        def segment_rows(attr: str, key: str) -> List[Dict[str, Any]]:
+            rows = []
+            for value, stats in self.segments[attr].items():
+                s_lo, s_hi = stats.ci95()
+                rows.append({key: value, "avg": round(stats.mean, 1), "count": stats.n,
+                             "ci95": [round(s_lo, 2), round(s_hi, 2)]})
+            return rows
+
+        results = {
+            "type": "scale",
+            "total": self.total,
+            "scored": scored,
+            "unparsed": self.unparsed,
+            "average": round(self.overall.mean, 1),
+            "average_ci95": [round(lo, 2), round(hi, 2)],
+            "std": round(self.overall.std, 2),
+            "distribution": [{"score": i + 1, "count": c, "pct": _pct(c, scored)}
+                             for i, c in enumerate(self.distribution)],
+            "positive": sum(self.distribution[6:]),
+            "neutral": sum(self.distribution[3:6]),
+            "negative": sum(self.distribution[:3]),
+        }
+        for attr, name in DEFAULT_SEGMENTS.items():
+            results[name] = segment_rows(attr, SEGMENT_LABELS[attr])
+        if self.crosstab:
+            results["crosstabs"] = {attr: segment_rows(attr, "value") for attr in self.crosstab}
+        return results
+
+    def _choice_result(self) -> Dict[str, Any]:
+        results = {
+            "type": "choice",
+            "total": self.total,
+            "choices": [{"choice": k, "count": v, "pct": _pct(v, self.total),
+                         "ci95": _proportion_ci(v, self.total)}
+                        for k, v in self.choice_counts.items()],
+        }
+        if self.crosstab:
+            results["crosstabs"] = {
+                attr: [{"value": value, "count": sum(counts.values()),
+                        "choices": [{"choice": k, "count": v, "pct": _pct(v, sum(counts.values()))}
+                                    for k, v in counts.items()]}
+                       for value, counts in self.choice_segments[attr].items()]
+                for attr in self.crosstab
+            }
+        return results
+
+
+def _betacf(a: float, b: float, x: float) -> float:
+    """Continued fraction for the regularized incomplete beta function"""
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1.0, a - 1.0
+    c, d = 1.0, 1.0 - qab * x / qap
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 201):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1.0 + aa * d
+        d = 1.0 / (d if abs(d) > tiny else tiny)
+        c = 1.0 + aa / c
+        c = c if abs(c) > tiny else tiny
+        delta = d * c
+        h *= delta
+        if abs(delta - 1.0) < 1e-12:
+            break
+    return h
+
+
+def _betainc(a: float, b: float, x: float) -> float:
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b)
+                     + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * _betacf(a, b, x) / a
+    return 1.0 - front * _betacf(b, a, 1.0 - x) / b
+
+
+def t_test_p(t: float, df: int) -> float:
+    """Two-sided p-value of Student's t statistic"""
+    if df <= 0 or math.isnan(t):
+        return 1.0
+    if math.isinf(t):
+        return 0.0
+    return _betainc(df / 2.0, 0.5, df / (df + t * t))
+
+
+def z_test_p(z: float) -> float:
+    """Two-sided p-value of a standard normal statistic"""
+    return math.erfc(abs(z) / math.sqrt(2.0))
+
+
+def paired_summary(stats: RunningStats, alpha: float = 0.05) -> Dict[str, Any]:
+    """Mean paired difference with CI and a paired t-test against zero"""
+    n = stats.n
+    se = stats.std / math.sqrt(n) if n > 1 else 0.0
+    if n < 2:
+        t, p = 0.0, 1.0
+    elif se == 0.0:
+        t, p = (0.0, 1.0) if stats.mean == 0.0 else (math.copysign(math.inf, stats.mean), 0.0)
+    else:
+        t = stats.mean / se
+        p = t_test_p(t, n - 1)
+    lo, hi = stats.ci95()
+    return {
+        "pairs": n,
+        "mean_diff": round(stats.mean, 2),
+        "ci95": [round(lo, 2), round(hi, 2)],
+        "t": round(t, 3) if math.isfinite(t) else None,
+        "p_value": round(p, 4),
+        "significant": p < alpha,
+    }
+
+
+class PairedComparison:
+    """Per-persona score differences (variant - baseline), overall and per segment"""
+
+    def __init__(self, crosstab: Optional[List[str]] = None):
+        self.crosstab = [a for a in (crosstab or []) if a not in DEFAULT_SEGMENTS]
+        self.overall = RunningStats()
+        self.segments: Dict[str, Dict[Any, RunningStats]] = {
+            attr: {} for attr in list(DEFAULT_SEGMENTS) + self.crosstab
+        }
+
+    def add(self, diff: float, persona: dict):
+        self.overall.add(diff)
+        for attr, groups in self.segments.items():
+            value = persona_attribute(persona, attr)
+            stats = groups.get(value)
+            if stats is None:
+                stats = groups[value] = RunningStats()
+            stats.add(diff)
+
+    def result(self) -> Dict[str, Any]:
+        def rows(attr: str, key: str) -> List[Dict[str, Any]]:
+            return [{key: value, **paired_summary(stats)} for value, stats in self.segments[attr].items()]
+
+        results = {"overall": paired_summary(self.overall)}
+        for attr, name in DEFAULT_SEGMENTS.items():
+            results[name] = rows(attr, SEGMENT_LABELS[attr])
+        if self.crosstab:
+            results["crosstabs"] = {attr: rows(attr, "value") for attr in self.crosstab}
+        return results
+
+
+def mcnemar_p(to_variant: int, to_baseline: int) -> float:
+    """Two-sided McNemar p-value from the discordant pair counts.
+
+    Exact binomial test for fewer than 25 discordant pairs, otherwise the
+    chi-square approximation with continuity correction.
+    """
+    n = to_variant + to_baseline
+    if n == 0:
+        return 1.0
+    if n < 25:
+        k = min(to_variant, to_baseline)
+        tail = sum(math.comb(n, i) for i in range(k + 1)) / 2 ** n
+        return min(1.0, 2 * tail)
+    chi2 = (abs(to_variant - to_baseline) - 1) ** 2 / n
+    return z_test_p(math.sqrt(chi2))
+
+
+class ChoicePairs:
+    """Paired choices of one group: per option, how many pairs picked it and switched to/from it"""
+
+    __slots__ = ("pairs", "baseline", "variant", "gained", "lost")
+
+    def __init__(self):
+        self.pairs = 0
+        self.baseline: Dict[Any, int] = {}
+        self.variant: Dict[Any, int] = {}
+        # option -> pairs that chose it only in the variant / only in the baseline
+        self.gained: Dict[Any, int] = {}
+        self.lost: Dict[Any, int] = {}
+
+    def add(self, a: Any, b: Any):
+        self.pairs += 1
+        self.baseline[a] = self.baseline.get(a, 0) + 1
+        self.variant[b] = self.variant.get(b, 0) + 1
+        if a != b:
+            self.lost[a] = self.lost.get(a, 0) + 1
+            self.gained[b] = self.gained.get(b, 0) + 1
+
+    def summary(self, options: List[Any], alpha: float = 0.05) -> List[Dict[str, Any]]:
+        """Per option: shares, paired difference (variant - baseline) and McNemar test"""
+        rows = []
+        for option in options:
+            gained, lost = self.gained.get(option, 0), self.lost.get(option, 0)
+            p = mcnemar_p(gained, lost)
+            rows.append({
+                "choice": option,
+                "baseline_pct": _pct(self.baseline.get(option, 0), self.pairs),
+                "variant_pct": _pct(self.variant.get(option, 0), self.pairs),
+                "diff_pct": round((gained - lost) / self.pairs * 100, 1) if self.pairs else 0.0,
+                "switched_to": gained,
+                "switched_from": lost,
+                "p_value": round(p, 4),
+                "significant": p < alpha,
+            })
+        return rows
+
+
+class PairedChoiceComparison:
+    """Per-persona choices (baseline, variant), McNemar test per option, overall and per segment"""
+
+    def __init__(self, crosstab: Optional[List[str]] = None):
+        self.crosstab = [a for a in (crosstab or []) if a not in DEFAULT_SEGMENTS]
+        self.overall = ChoicePairs()
+        # Every option seen in either variant, in order of appearance
+        self.options: Dict[Any, None] = {}
+        self.segments: Dict[str, Dict[Any, ChoicePairs]] = {
+            attr: {} for attr in list(DEFAULT_SEGMENTS) + self.crosstab
+        }
+
+    def add(self, a: Any, b: Any, persona: dict):
+        self.options.setdefault(a)
+        self.options.setdefault(b)
+        self.overall.add(a, b)
+        for attr, groups in self.segments.items():
+            value = persona_attribute(persona, attr)
+            pairs = groups.get(value)
+            if pairs is None:
+                pairs = groups[value] = ChoicePairs()
+            pairs.add(a, b)
+
+    def result(self) -> Dict[str, Any]:
+        options = list(self.options)
+
+        def rows(attr: str, key: str) -> List[Dict[str, Any]]:
+            return [{key: value, "pairs": pairs.pairs, "choices": pairs.summary(options)}
+                    for value, pairs in self.segments[attr].items()]
+
+        results: Dict[str, Any] = {"pairs": self.overall.pairs, "choices": self.overall.summary(options)}
+        for attr, name in DEFAULT_SEGMENTS.items():
+            results[name] = rows(attr, SEGMENT_LABELS[attr])
+        if self.crosstab:
+            results["crosstabs"] = {attr: rows(attr, "value") for attr in self.crosstab}
+        return results
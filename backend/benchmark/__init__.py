@@ -0,0 +1,5 @@
+"""
+Benchmarks for the /api/test pipeline (run from backend/: python -m benchmark)
+"""
+from benchmark.mock_anthropic import MockAnthropic, MockServer, parse_latency
+from benchmark.runner import run, compare
@@ -0,0 +1,89 @@
+"""
+python -m benchmark run --out bench.json
+python -m benchmark compare base.json bench.json
+"""
+import argparse
+import json
+import sys
+from typing import List
+
+from benchmark.runner import run, compare, MODES, DEFAULT_HYPOTHESIS
+
+
+def int_list(value: str) -> List[int]:
+    return [int(x) for x in value.split(",") if x]
+
+
+def env_pairs(values: List[str]) -> dict:
+    env = {}
+    for item in values:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got {item!r}")
+        env[key] = value
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark the /api/test pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("run", help="run the benchmark and write a JSON report")
+    p.add_argument("--out", default="bench.json")
+    p.add_argument("--modes", default=",".join(MODES), help="simulated,llm")
+    p.add_argument("--personas", type=int_list, default=[50, 500], help="persona counts, e.g. 50,500,5000")
+    p.add_argument("--concurrency", type=int_list, default=[1, 4, 16], help="concurrent tests, e.g. 1,4,16")
+    p.add_argument("--requests-per-worker", type=int, default=2)
+    p.add_argument("--latency", default="lognormal:0.05,0.5",
+                   help="mock upstream latency: fixed:S | uniform:LO,HI | normal:MEAN,STD | "
+                        "lognormal:MEDIAN,SIGMA | exp:MEAN")
+    p.add_argument("--error-rate", type=float, default=0.0, help="share of 529 responses from the mock")
+    p.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of 429 responses from the mock")
+    p.add_argument("--retry-after", type=float, default=1.0)
+    p.add_argument("--hypothesis", default=DEFAULT_HYPOTHESIS)
+    p.add_argument("--question-type", choices=["scale", "choice"], default="scale")
+    p.add_argument("--batch-size", type=int, default=1)
+    p.add_argument("--timeout", type=float, default=600.0, help="per /api/test request, s")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                   help="extra app server environment, e.g. --env LLM_MAX_CONCURRENCY=64")
+
+    c = commands.add_parser("compare", help="compare two reports")
+    c.add_argument("base")
+    c.add_argument("head")
+    c.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        modes = [m for m in args.modes.split(",") if m]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+        report = run(modes, args.personas, args.concurrency, args.requests_per_worker, args.latency,
+                     args.error_rate, args.rate_limit_rate, args.retry_after, args.hypothesis,
+                     args.question_type, batch_size=args.batch_size, timeout=args.timeout,
+                     seed=args.seed, app_extra_env=env_pairs(args.env))
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Wrote {args.out}")
+        return
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, encoding="utf-8") as f:
+        head = json.load(f)
+    result = compare(base, head, args.threshold)
+
+    def pct(change):
+        return "n/a" if change is None else f"{change:+.1%}"
+
+    for row in result["rows"]:
+        print(f"{row['section']:18} {str(row['key']):32} p95 {pct(row['p95_change']):>8}  "
+              f"throughput {pct(row['throughput_change']):>8}  {'REGRESSED' if row['regressed'] else 'ok'}")
+    print(f"{result['regressions']} regression(s) over {args.threshold:.0%}")
+    sys.exit(1 if result["regressions"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Local mock of the Anthropic Messages API with configurable latency and faults
+
+Answers both single-persona and batch prompts in the shape main.py parses,
+so the whole /api/test pipeline runs end to end without a real key:
+
+    python -m benchmark.mock_anthropic --port 8901 --latency lognormal:0.3,0.5 --error-rate 0.05
+    ANTHROPIC_API_KEY=mock ANTHROPIC_BASE_URL=http://127.0.0.1:8901 uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, Callable
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_KINDS = ("fixed", "uniform", "normal", "lognormal", "exp")
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Sampler for a latency spec, in seconds.
+
+    fixed:S, uniform:LO,HI, normal:MEAN,STD, lognormal:MEDIAN,SIGMA, exp:MEAN
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        params = [float(x) for x in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"Bad latency spec: {spec!r}")
+    if kind == "fixed" and len(params) == 1:
+        return lambda rng: params[0]
+    if kind == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal" and len(params) == 2:
+        mu = math.log(params[0]) if params[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    if kind == "exp" and len(params) == 1:
+        return lambda rng: rng.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+    raise ValueError(f"Bad latency spec: {spec!r} (expected one of {', '.join(LATENCY_KINDS)})")
+
+
+def _error(status: int, kind: str, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"type": "error", "error": {"type": kind, "message": message}},
+                        status_code=status, headers=headers)
+
+
+class MockAnthropic:
+    """Mock upstream state: latency sampler, fault rates and counters"""
+
+    def __init__(self, latency: str = "fixed:0.05", error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: float = 1.0, seed: Optional[int] = None):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "peak_in_flight": self.peak_in_flight,
+            "latency": self.latency_spec,
+            "error_rate": self.error_rate,
+            "rate_limit_rate": self.rate_limit_rate,
+        }
+
+    def answer(self, body: Dict[str, Any]) -> str:
+        system = body.get("system", "")
+        if not isinstance(system, str):
+            system = "".join(block.get("text", "") for block in system)
+        question = "".join(m["content"] if isinstance(m["content"], str) else json.dumps(m["content"])
+                           for m in body.get("messages", []))
+        options = len(re.findall(r"^\d+\. ", question, re.MULTILINE))
+
+        def one() -> Dict[str, Any]:
+            if options:
+                return {"choice": self.rng.randint(1, options), "reasoning": "Мок-відповідь"}
+            return {"score": self.rng.randint(1, 10), "reasoning": "Мок-відповідь"}
+
+        ids = re.findall(r"persona_id=(\d+)", system)
+        if ids:
+            return json.dumps([{"persona_id": int(i), **one()} for i in ids], ensure_ascii=False)
+        return json.dumps(one(), ensure_ascii=False)
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI(title="Mock Anthropic API")
+
+        @app.post("/v1/messages")
+        async def messages(request: Request):
+            body = await request.json()
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.sample_latency(self.rng))
+                roll = self.rng.random()
+                if roll < self.rate_limit_rate:
+                    self.rate_limited += 1
+                    return _error(429, "rate_limit_error", "Rate limited",
+                                  headers={"retry-after": str(self.retry_after)})
+                if roll < self.rate_limit_rate + self.error_rate:
+                    self.errors += 1
+                    return _error(529, "overloaded_error", "Overloaded")
+                text = self.answer(body)
+                prompt_chars = len(json.dumps(body, ensure_ascii=False))
+                return {
+                    "id": f"msg_mock_{self.requests}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model", "mock"),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "usage": {"input_tokens": prompt_chars // 4, "output_tokens": len(text) // 4,
+                              "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0},
+                }
+            finally:
+                self.in_flight -= 1
+
+        @app.get("/_mock/stats")
+        async def mock_stats():
+            return self.stats()
+
+        @app.post("/_mock/reset")
+        async def mock_reset():
+            self.reset()
+            return self.stats()
+
+        return app
+
+
+class MockServer:
+    """Runs a MockAnthropic app with uvicorn on a background thread"""
+
+    def __init__(self, mock: MockAnthropic, host: str = "127.0.0.1", port: int = 0):
+        self.mock = mock
+        self.host = host
+        self.port = port
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0):
+        config = uvicorn.Config(self.mock.create_app(), host=self.host, port=self.port,
+                                log_level="warning", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Mock Anthropic server did not start")
+            time.sleep(0.02)
+        if not self.port:
+            self.port = self._server.servers[0].sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=10)
+            self._server = None
+
+    def __enter__(self) -> "MockServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", default="fixed:0.05",
+                        help="fixed:S | uniform:LO,HI | normal:MEAN,STD | lognormal:MEDIAN,SIGMA | exp:MEAN")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 529 overloaded responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after on 429, s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = MockAnthropic(args.latency, args.error_rate, args.rate_limit_rate, args.retry_after, args.seed)
+    uvicorn.run(mock.create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+Load generator for the /api/test pipeline
+
+For every mode x persona count a real app server (uvicorn main:app) is
+started in a subprocess, pointed at a mock Anthropic server (mode "llm") or
+at no key at all (mode "simulated", i.e. simulate_response), and driven
+with closed-loop workers at each concurrency level. simulate_response is
+also timed in-process per call.
+"""
+import asyncio
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
+
+import httpx
+import numpy as np
+
+from benchmark.mock_anthropic import MockAnthropic, MockServer
+from population import generate_population, load_seed_personas
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPORT_VERSION = 1
+MODES = ("simulated", "llm")
+DEFAULT_HYPOTHESIS = "Наскільки вам цікава підписка на CBD продукти зі знижкою 15%?"
+SERVER_START_TIMEOUT = 60.0
+
+
+def percentiles(samples: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/mean/max of samples, multiplied by scale (s -> ms by default)"""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(samples) * scale
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(values.mean()), 3), "max": round(float(values.max()), 3)}
+
+
+def process_memory(pid: int) -> Dict[str, Optional[float]]:
+    """Current and peak RSS of a process in MiB (Linux /proc; None elsewhere)"""
+    memory: Dict[str, Optional[float]] = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    memory["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return memory
+
+
+def self_peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def population_prefix(size: int, workdir: str, seed: int = 0) -> Optional[str]:
+    """Saved population of `size` personas, or None to use the seed personas as-is"""
+    if size == len(load_seed_personas()):
+        return None
+    prefix = os.path.join(workdir, f"population_{size}")
+    if not os.path.exists(prefix + ".npy"):
+        generate_population(size, seed=seed).save(prefix)
+    return prefix
+
+
+class AppServer:
+    """uvicorn main:app in a subprocess with an isolated environment"""
+
+    def __init__(self, env: Dict[str, str], port: Optional[int] = None):
+        self.port = port or free_port()
+        self.env = env
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+             "--port", str(self.port), "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR, env=self.env,
+        )
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"App server exited with code {self.process.returncode}")
+            try:
+                if httpx.get(self.url + "/api/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("App server did not become healthy")
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def __enter__(self) -> "AppServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def drive(url: str, body: Dict[str, Any], concurrency: int, requests: int,
+                timeout: float) -> Dict[str, Any]:
+    """Closed loop: `concurrency` workers send `requests` POST /api/test in total"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    sources: Dict[str, int] = {}
+    responses = 0
+    remaining = requests
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining, responses
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                r = await client.post("/api/test", json=body)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            elapsed = time.perf_counter() - started
+            if r.status_code != 200:
+                errors[str(r.status_code)] = errors.get(str(r.status_code), 0) + 1
+                continue
+            latencies.append(elapsed)
+            results = r.json()["results"]
+            responses += results.get("total", 0)
+            for source, count in results.get("sources", {}).items():
+                sources[source] = sources.get(source, 0) + count
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "latency_ms": percentiles(latencies),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "responses_per_s": round(responses / wall, 1) if wall else None,
+        "sources": sources,
+    }
+
+
+def app_env(mode: str, mock_url: str, population: Optional[str], workdir: str,
+            extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "ANTHROPIC_API_KEY": "benchmark" if mode == "llm" else "",
+        "ANTHROPIC_BASE_URL": mock_url,
+        "RESULT_STORE_URL": "sqlite:///" + os.path.join(workdir, f"results_{os.getpid()}.db"),
+        "RESPONSE_CACHE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+        "PYTHONUNBUFFERED": "1",
+    })
+    if population:
+        env["PERSONA_POPULATION"] = population
+    else:
+        env.pop("PERSONA_POPULATION", None)
+    env.update(extra or {})
+    return env
+
+
+def bench_pipeline(mode: str, persona_counts: List[int], concurrency: List[int], mock: MockServer,
+                   workdir: str, body: Dict[str, Any], requests_per_worker: int, timeout: float,
+                   app_extra_env: Optional[Dict[str, str]] = None, log=print) -> List[Dict[str, Any]]:
+    rows = []
+    for size in persona_counts:
+        env = app_env(mode, mock.url, population_prefix(size, workdir), workdir, app_extra_env)
+        with AppServer(env) as server:
+            idle = process_memory(server.process.pid)
+            for level in concurrency:
+                mock.mock.reset()
+                before = httpx.get(server.url + "/api/health", timeout=10).json()["llm"]
+                total = max(requests_per_worker * level, level)
+                run = asyncio.run(drive(server.url, body, level, total, timeout))
+                health = httpx.get(server.url + "/api/health", timeout=10).json()
+                row = {
+                    "mode": mode,
+                    "personas": size,
+                    "concurrency": level,
+                    **run,
+                    "memory": {"idle_rss_mb": idle["rss_mb"], **process_memory(server.process.pid)},
+                    "results_stored": health.get("results"),
+                }
+                if mode == "llm":
+                    row["upstream"] = mock.mock.stats()
+                    llm = health["llm"]
+                    row["llm"] = {
+                        **{k: llm[k] - before[k] for k in ("retries", "hedged", "hedge_wins")},
+                        **{k: llm[k] for k in ("latency", "circuit")},
+                    }
+                rows.append(row)
+                log(f"{mode:9} personas={size:<7} c={level:<4} p50={row['latency_ms']['p50']}ms "
+                    f"p95={row['latency_ms']['p95']}ms p99={row['latency_ms']['p99']}ms "
+                    f"rps={row['throughput_rps']} rss={row['memory']['rss_mb']}MiB")
+    return rows
+
+
+def bench_simulate_response(persona_counts: List[int], hypothesis: str,
+                            options: Optional[List[str]] = None, log=print) -> List[Dict[str, Any]]:
+    """Per-call cost of simulate_response over every persona of each population"""
+    os.environ.setdefault("RESULT_STORE_URL", "sqlite:///:memory:")
+    from main import simulate_response
+
+    rows = []
+    seed_personas = load_seed_personas()
+    for size in persona_counts:
+        if size == len(seed_personas):
+            personas = seed_personas
+        else:
+            personas = list(generate_population(size, seed=0))
+        for question_type in ("scale", "choice"):
+            opts = options if question_type == "choice" else None
+            timings = []
+            started = time.perf_counter()
+            for persona in personas:
+                t = time.perf_counter()
+                simulate_response(persona, hypothesis, question_type, opts)
+                timings.append(time.perf_counter() - t)
+            wall = time.perf_counter() - started
+            row = {
+                "personas": size,
+                "question_type": question_type,
+                "latency_us": percentiles(timings, scale=1e6),
+                "calls_per_s": round(len(personas) / wall, 1) if wall else None,
+                "peak_rss_mb": self_peak_rss_mb(),
+            }
+            rows.append(row)
+            log(f"simulate_response personas={size:<7} {question_type:6} "
+                f"p50={row['latency_us']['p50']}us p99={row['latency_us']['p99']}us "
+                f"calls/s={row['calls_per_s']}")
+    return rows
+
+
+def run(modes: List[str], persona_counts: List[int], concurrency: List[int],
+        requests_per_worker: int = 2, latency: str = "lognormal:0.05,0.5", error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0, retry_after: float = 1.0, hypothesis: str = DEFAULT_HYPOTHESIS,
+        question_type: str = "scale", options: Optional[List[str]] = None, batch_size: int = 1,
+        timeout: float = 600.0, seed: Optional[int] = 0, app_extra_env: Optional[Dict[str, str]] = None,
+        log=print) -> Dict[str, Any]:
+    options = options or ["Так", "Ні", "Можливо"]
+    body = {"hypothesis": hypothesis, "question_type": question_type, "cache": "bypass",
+            "batch_size": batch_size}
+    if question_type == "choice":
+        body["options"] = options
+
+    report: Dict[str, Any] = {
+        "version": REPORT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "config": {
+            "modes": modes, "personas": persona_counts, "concurrency": concurrency,
+            "requests_per_worker": requests_per_worker, "request": body,
+            "mock": {"latency": latency, "error_rate": error_rate, "rate_limit_rate": rate_limit_rate,
+                     "retry_after": retry_after, "seed": seed},
+            "app_env": app_extra_env or {},
+        },
+        "pipeline": [],
+        "simulate_response": [],
+    }
+
+    mock = MockServer(MockAnthropic(latency, error_rate, rate_limit_rate, retry_after, seed))
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir, mock:
+        for mode in modes:
+            report["pipeline"] += bench_pipeline(mode, persona_counts, concurrency, mock, workdir, body,
+                                                 requests_per_worker, timeout, app_extra_env, log)
+    report["simulate_response"] = bench_simulate_response(persona_counts, hypothesis, options, log)
+    return report
+
+
+def _key(row: Dict[str, Any]) -> Tuple:
+    return (row.get("mode"), row.get("personas"), row.get("concurrency"), row.get("question_type"))
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float = 0.1) -> Dict[str, Any]:
+    """Relative change of p95 latency and throughput per matching row.
+
+    A row regresses when p95 grows, or throughput drops, by more than
+    `threshold` (a fraction).
+    """
+    def change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+        return round((new - old) / old, 4) if old and new is not None else None
+
+    rows, regressions = [], 0
+    for section, latency_field, rate_field in (("pipeline", "latency_ms", "throughput_rps"),
+                                               ("simulate_response", "latency_us", "calls_per_s")):
+        old_rows = {_key(r): r for r in base.get(section, [])}
+        for new in head.get(section, []):
+            old = old_rows.get(_key(new))
+            if old is None:
+                continue
+            p95 = change(old[latency_field]["p95"], new[latency_field]["p95"])
+            rate = change(old[rate_field], new[rate_field])
+            regressed = (p95 is not None and p95 > threshold) or (rate is not None and rate < -threshold)
+            regressions += regressed
+            rows.append({"section": section, "key": [k for k in _key(new) if k is not None],
+                         "p95_change": p95, "throughput_change": rate, "regressed": regressed})
+    return {"base": base.get("commit"), "head": head.get("commit"), "threshold": threshold,
+            "regressions": regressions, "rows": rows}
@@ -0,0 +1,20 @@
+"""
+HTTP conditional request helpers (ETag / If-None-Match), shared by the API and static serving
+"""
+import hashlib
+from typing import Optional
+
+
+def make_etag(data: bytes, suffix: str = "") -> str:
+    """Strong ETag from a content hash; suffix tells encoded variants apart"""
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + suffix + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in (t[2:] if t.startswith("W/") else t for t in tags)
@@ -0,0 +1,186 @@
+"""
+Background job queue for long-running tests
+"""
+import asyncio
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Callable, Awaitable
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "32"))
+# Finished jobs kept around for polling before the oldest are dropped
+JOB_RETAIN = int(os.environ.get("JOB_RETAIN", "200"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, request: Any, total: int):
+        self.id = f"job_{uuid.uuid4().hex}"
+        self.request = request
+        self.status = QUEUED
+        self.total = total
+        self.done = 0
+        # Only while running: finished jobs keep counts, the stored result id
+        # and, when stopped early, a snapshot of the aggregate
+        self.responses: List[dict] = []
+        # Running aggregate maintained by the runner (anything with .result())
+        self.aggregate: Optional[Any] = None
+        self.result: Optional[dict] = None
+        self.result_id: Optional[str] = None
+        self.partial: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, response: dict):
+        self.responses.append(response)
+        self.done += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "hypothesis": getattr(self.request, "hypothesis", None),
+            "done": self.done,
+            "total": self.total,
+            "result_id": self.result_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+JobRunner = Callable[[Job], Awaitable[dict]]
+
+
+class JobManager:
+    """Bounded queue drained by a fixed pool of worker tasks.
+
+    submit() raises QueueFullError instead of waiting, so callers can turn
+    bursts into 429s. Each job runs in its own task so cancel() can stop it
+    (and its outstanding LLM calls) without killing the worker.
+    """
+
+    def __init__(self, runner: JobRunner, workers: int = JOB_WORKERS,
+                 queue_size: int = JOB_QUEUE_SIZE, retain: int = JOB_RETAIN):
+        self.runner = runner
+        self.workers = workers
+        self.queue_size = queue_size
+        self.retain = retain
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for job in self.jobs.values():
+            if job._task is not None:
+                job._task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def submit(self, request: Any, total: int) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobManager is not started")
+        job = Job(request, total)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Job queue is full ({self.queue_size})")
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        if job._task is not None:
+            job._task.cancel()
+        # A queued job is skipped by the worker when dequeued
+        self._finish(job, CANCELLED)
+        return job
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self.jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_depth": self.depth,
+            "queue_size": self.queue_size,
+            "jobs": by_status,
+        }
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started_at = datetime.now().isoformat()
+                task = job._task = asyncio.create_task(self.runner(job))
+                try:
+                    result = await task
+                    if job.status == RUNNING:
+                        job.result = result
+                        self._finish(job, DONE)
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        # The worker itself is being cancelled (shutdown)
+                        raise
+                    self._finish(job, CANCELLED)
+                except Exception as e:
+                    job.error = str(e) or e.__class__.__name__
+                    self._finish(job, FAILED)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = datetime.now().isoformat()
+        job._task = None
+        # Retained jobs must stay small: the result is in the result store
+        if job.result is not None:
+            job.result_id = job.result.get("id")
+        elif job.aggregate is not None and job.done:
+            job.partial = job.aggregate.result()
+        job.responses = []
+        job.aggregate = None
+        job.result = None
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.status in FINISHED]
+        for job in finished[:max(0, len(self.jobs) - self.retain)]:
+            del self.jobs[job.id]
@@ -0,0 +1,381 @@
+"""
+Shared HTTP client for the Anthropic Messages API
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Optional, List, Dict, Any
+
+import httpx
+
+from metrics import UPSTREAM_LATENCY, UPSTREAM_RETRIES, UPSTREAM_HEDGED
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+# Override to point at a local mock server in tests / benchmarks
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+ANTHROPIC_VERSION = "2023-06-01"
+CLAUDE_MODEL = os.environ.get("CLAUDE_MODEL", "claude-sonnet-4-20250514")
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "32"))
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", "20"))
+# Send a duplicate request once a call is slower than this latency percentile
+LLM_HEDGE = os.environ.get("LLM_HEDGE", "1") != "0"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+class TokenUsage:
+    """Sums the `usage` blocks of Messages API responses"""
+
+    def __init__(self):
+        self.requests = 0
+        self.tokens = {field: 0 for field in USAGE_FIELDS}
+
+    def add(self, usage: Optional[Dict[str, Any]]):
+        self.requests += 1
+        for field in USAGE_FIELDS:
+            self.tokens[field] += (usage or {}).get(field) or 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"requests": self.requests, **self.tokens}
+
+
+# Usage of the test currently running in this context (set per request)
+current_usage: ContextVar[Optional[TokenUsage]] = ContextVar("current_usage", default=None)
+total_usage = TokenUsage()
+
+
+def record_usage(usage: Optional[Dict[str, Any]]):
+    total_usage.add(usage)
+    meter = current_usage.get()
+    if meter is not None:
+        meter.add(usage)
+
+
+class CircuitOpenError(Exception):
+    """Upstream is considered down; the call was not attempted"""
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures and fails fast for `cooldown` s.
+
+    After the cooldown one probe call is let through (half-open); its
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self._probing = False
+
+    def release(self):
+        """The call let through by allow() ended without an outcome (cancelled, unexpected error)"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def request_shape(payload: Dict[str, Any]) -> str:
+    """Latency class of a call: max_tokens rounded up to a power of two.
+
+    Single-persona calls and batch calls (max_tokens scales with batch size)
+    land in different classes, so batches are not hedged against the
+    single-call p95.
+    """
+    max_tokens = int(payload.get("max_tokens") or 1)
+    return f"max_tokens_{1 << (max_tokens - 1).bit_length()}"
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """One pooled keep-alive client per process, shared by every test.
+
+    The semaphore caps in-flight Messages API calls across all concurrent
+    requests, not per request, so parallel tests queue instead of piling
+    up 429s. 429/5xx and transport errors are retried with jittered
+    exponential backoff (honouring retry-after; a retry-after longer than
+    LLM_BACKOFF_MAX ends the retries), calls slower than the recent p95 of
+    calls of the same shape are hedged with a duplicate request, and a
+    circuit breaker fails fast with CircuitOpenError while the upstream is
+    degraded.
+    """
+
+    def __init__(
+        self,
+        base_url: str = ANTHROPIC_BASE_URL,
+        api_key: str = ANTHROPIC_API_KEY,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+        hedge: bool = LLM_HEDGE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.in_flight = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.breaker = CircuitBreaker()
+        # request_shape() -> latencies of that kind of call
+        self.latency: Dict[str, LatencyTracker] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def started(self) -> bool:
+        return self._client is not None
+
+    async def start(self):
+        if self._client is not None:
+            return
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=60.0,
+            ),
+            timeout=self.timeout,
+            headers={
+                "x-api-key": self.api_key,
+                "anthropic-version": ANTHROPIC_VERSION,
+                "content-type": "application/json",
+            },
+        )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def post_messages(self, payload: Dict[str, Any]) -> httpx.Response:
+        """POST /v1/messages with retries, hedging and the circuit breaker.
+
+        Returns the last response once retries are exhausted (the caller
+        checks status_code); raises CircuitOpenError when the circuit is
+        open, or the last transport error if no response was ever received.
+        """
+        if self._client is None:
+            # Lazily start when used outside the app lifespan (scripts, tests)
+            await self.start()
+
+        response: Optional[httpx.Response] = None
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                if response is not None:
+                    return response
+                raise CircuitOpenError("Anthropic API circuit is open")
+
+            delay = None
+            try:
+                response = await self._hedged_post(payload)
+                error = None
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                response, error = None, e
+            except BaseException:
+                # Cancelled or unexpected: no verdict on the upstream, but a
+                # half-open probe must not stay claimed forever
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                delay = retry_after_seconds(response)
+
+            if attempt == self.max_retries:
+                break
+            if delay is None:
+                # Full jitter
+                delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+            elif delay > LLM_BACKOFF_MAX:
+                # The server asked for a longer pause than we are willing to
+                # wait: give up rather than retry before retry-after
+                break
+            self.retries += 1
+            UPSTREAM_RETRIES.inc()
+            await asyncio.sleep(delay)
+
+        if response is not None:
+            return response
+        raise error
+
+    def _tracker(self, shape: str) -> LatencyTracker:
+        tracker = self.latency.get(shape)
+        if tracker is None:
+            tracker = self.latency[shape] = LatencyTracker()
+        return tracker
+
+    async def _hedged_post(self, payload: Dict[str, Any]) -> httpx.Response:
+        tracker = self._tracker(request_shape(payload))
+        hedge_after = tracker.percentile(LLM_HEDGE_PERCENTILE) if self.hedge else None
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._post(payload, tracker, sent))
+        tasks = [primary]
+        try:
+            if hedge_after is None:
+                return await primary
+
+            # Time the call itself, not the wait for a semaphore slot
+            waiter = asyncio.ensure_future(sent.wait())
+            tasks.append(waiter)
+            await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            self.hedged += 1
+            UPSTREAM_HEDGED.inc()
+            backup = asyncio.ensure_future(self._post(payload, tracker))
+            tasks.append(backup)
+            pending = {primary, backup}
+            failed: List[asyncio.Future] = []
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Take the first success; a failed copy (error or retryable
+                # status) waits for the other one
+                for task in done:
+                    if task.exception() is None and task.result().status_code not in RETRY_STATUSES:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    failed.append(task)
+            # Every copy failed: prefer a response (its status drives retries) over an exception
+            responses = [task for task in failed if task.exception() is None]
+            return (responses[0] if responses else failed[0]).result()
+        finally:
+            # Also runs when the caller is cancelled: no copy may outlive it
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _post(self, payload: Dict[str, Any], tracker: LatencyTracker,
+                    sent: Optional[asyncio.Event] = None) -> httpx.Response:
+        async with self._semaphore:
+            if sent is not None:
+                sent.set()
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                response = await self._client.post("/v1/messages", json=payload)
+            except httpx.TransportError:
+                UPSTREAM_LATENCY.observe(time.monotonic() - started, status="error")
+                raise
+            finally:
+                self.in_flight -= 1
+        elapsed = time.monotonic() - started
+        UPSTREAM_LATENCY.observe(elapsed, status=response.status_code)
+        if response.status_code == 200:
+            tracker.add(elapsed)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "http2": HTTP2_AVAILABLE,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "latency": {shape: {"samples": len(t.samples), "p50": t.percentile(50), "p95": t.percentile(95)}
+                        for shape, t in sorted(self.latency.items())},
+            "circuit": self.breaker.stats(),
+            "usage": total_usage.as_dict(),
+        }
+
+
+llm_client = LLMClient()
@@ -1,19 +1,52 @@
 """
 Synthetic Focus Group API for HUMANIST
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal, AsyncIterator, Sequence, Tuple, Union
 import json
 import os
+import re
 import asyncio
-import httpx
+import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-app = FastAPI(title="Synthetic Focus Group API", version="1.0.0")
+import numpy as np
+
+from llm import (llm_client, ANTHROPIC_API_KEY, CLAUDE_MODEL, CircuitOpenError,
+                 TokenUsage, current_usage, record_usage)
+from prompts import prompt_builder, PROMPT_VERSION, SINGLE_CALL_CACHE_NOTE
+from cache import response_cache, cache_key
+from jobs import Job, JobManager, QueueFullError
+from store import create_store, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from registry import PersonaRegistry
+from aggregate import ResponseAggregator, PairedComparison, PairedChoiceComparison, parse_score
+from population import load_personas
+from simulation import parse_hypothesis, parse_option, simulate_bulk, MAX_SAMPLES
+from metrics import (metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, RESPONSES, FALLBACKS,
+                     PARSE_FAILURES, TEST_SECONDS, LLM_IN_FLIGHT, CIRCUIT_OPEN, RESULT_STORE_SIZE)
+from tracing import logger, setup_logging, start_trace, span
+from static import StaticManifest
+from conditional import etag_matches
+
+setup_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await llm_client.start()
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await llm_client.close()
+    response_cache.close()
+    result_store.close()
+
+
+app = FastAPI(title="Synthetic Focus Group API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,61 +56,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load personas
-PERSONAS = json.loads('''
-[
-  {"id":1,"name":"Олена Коваленко","age":34,"gender":"female","city":"Київ","occupation":"IT Project Manager","income":"50000-75000","state_primary":"stress","state_secondary":"sleep","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"low","personality":"Аналітик, довіряє дослідженням. Працює в IT, стресує через дедлайни."},
-  {"id":2,"name":"Андрій Мельник","age":42,"gender":"male","city":"Київ","occupation":"Власник бізнесу","income":"100000+","state_primary":"stress","state_secondary":"focus","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"very_low","personality":"Підприємець, цінує час, готовий платити за найкраще."},
-  {"id":3,"name":"Марія Шевченко","age":28,"gender":"female","city":"Київ","occupation":"Маркетолог","income":"35000-50000","state_primary":"energy","state_secondary":"focus","lifestyle":"creative_professional","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Креативна, слідкує за трендами. Цікавиться CBD, але обережна."},
-  {"id":4,"name":"Ігор Бондаренко","age":55,"gender":"male","city":"Київ","occupation":"Лікар","income":"50000-75000","state_primary":"sleep","state_secondary":"recovery","lifestyle":"wellness_enthusiast","cbd_experience":"experienced","price_sensitivity":"low","personality":"Лікар, скептик до непідтверджених заяв."},
-  {"id":5,"name":"Катерина Ткаченко","age":38,"gender":"female","city":"Київ","occupation":"HR директор","income":"75000-100000","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"low","personality":"Відповідає за wellbeing команди."},
-  {"id":6,"name":"Василь Петренко","age":67,"gender":"male","city":"Київ","occupation":"Пенсіонер","income":"20000-35000","state_primary":"sleep","state_secondary":"immunity","lifestyle":"conscious_consumer","cbd_experience":"beginner","price_sensitivity":"high","personality":"Консервативний, обережний."},
-  {"id":7,"name":"Софія Литвиненко","age":22,"gender":"female","city":"Київ","occupation":"Студентка","income":"до 20000","state_primary":"focus","state_secondary":"stress","lifestyle":"biohacker","cbd_experience":"intermediate","price_sensitivity":"high","personality":"Gen Z, цікавиться біохакінгом."},
-  {"id":8,"name":"Наталія Кравченко","age":45,"gender":"female","city":"Київ","occupation":"Бухгалтер","income":"35000-50000","state_primary":"stress","state_secondary":"sleep","lifestyle":"conscious_consumer","cbd_experience":"none","price_sensitivity":"medium","personality":"Скептик, але відкрита."},
-  {"id":9,"name":"Олександр Савченко","age":31,"gender":"male","city":"Київ","occupation":"Frontend розробник","income":"75000-100000","state_primary":"focus","state_secondary":"energy","lifestyle":"biohacker","cbd_experience":"experienced","price_sensitivity":"low","personality":"Технар, оптимізує все."},
-  {"id":10,"name":"Людмила Гончар","age":58,"gender":"female","city":"Київ","occupation":"Вчителька","income":"20000-35000","state_primary":"sleep","state_secondary":"stress","lifestyle":"holistic_believer","cbd_experience":"beginner","price_sensitivity":"high","personality":"Віддає перевагу натуральним засобам."},
-  {"id":11,"name":"Дмитро Яременко","age":36,"gender":"male","city":"Київ","occupation":"Фінансовий аналітик","income":"75000-100000","state_primary":"stress","state_secondary":"focus","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Аналітик, порівнює варіанти."},
-  {"id":12,"name":"Оксана Пономаренко","age":41,"gender":"female","city":"Київ","occupation":"Психолог","income":"50000-75000","state_primary":"stress","state_secondary":"recovery","lifestyle":"wellness_enthusiast","cbd_experience":"experienced","price_sensitivity":"low","personality":"Практикуючий психолог."},
-  {"id":13,"name":"Артем Лисенко","age":24,"gender":"male","city":"Київ","occupation":"Контент-криейтор","income":"35000-50000","state_primary":"energy","state_secondary":"focus","lifestyle":"creative_professional","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Створює контент для брендів."},
-  {"id":14,"name":"Ірина Москаленко","age":52,"gender":"female","city":"Київ","occupation":"Підприємець","income":"75000-100000","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"low","personality":"Власниця салону краси."},
-  {"id":15,"name":"Богдан Кучер","age":29,"gender":"male","city":"Київ","occupation":"Фітнес-тренер","income":"35000-50000","state_primary":"recovery","state_secondary":"energy","lifestyle":"fitness_focused","cbd_experience":"experienced","price_sensitivity":"medium","personality":"Професійний тренер."},
-  {"id":16,"name":"Вікторія Романенко","age":33,"gender":"female","city":"Київ","occupation":"Юрист","income":"75000-100000","state_primary":"stress","state_secondary":"sleep","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"low","personality":"Юрист, цінує прозорість."},
-  {"id":17,"name":"Тетяна Федоренко","age":47,"gender":"female","city":"Київ","occupation":"Менеджер","income":"50000-75000","state_primary":"sleep","state_secondary":"stress","lifestyle":"conscious_consumer","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Проблеми зі сном."},
-  {"id":18,"name":"Максим Поліщук","age":19,"gender":"male","city":"Київ","occupation":"Студент IT","income":"до 20000","state_primary":"focus","state_secondary":"energy","lifestyle":"biohacker","cbd_experience":"beginner","price_sensitivity":"very_high","personality":"Студент-айтішник."},
-  {"id":19,"name":"Галина Захарченко","age":62,"gender":"female","city":"Київ","occupation":"Пенсіонерка","income":"20000-35000","state_primary":"immunity","state_secondary":"sleep","lifestyle":"holistic_believer","cbd_experience":"beginner","price_sensitivity":"high","personality":"Колишня медсестра."},
-  {"id":20,"name":"Роман Ковальчук","age":39,"gender":"male","city":"Київ","occupation":"Архітектор","income":"50000-75000","state_primary":"focus","state_secondary":"stress","lifestyle":"creative_professional","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Архітектор, цінує дизайн."},
-  {"id":21,"name":"Юлія Сидоренко","age":35,"gender":"female","city":"Львів","occupation":"IT рекрутер","income":"50000-75000","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Працює у львівській IT-компанії."},
-  {"id":22,"name":"Михайло Гнатюк","age":48,"gender":"male","city":"Львів","occupation":"Підприємець","income":"50000-75000","state_primary":"energy","state_secondary":"stress","lifestyle":"wellness_enthusiast","cbd_experience":"experienced","price_sensitivity":"medium","personality":"Власник кав'ярні."},
-  {"id":23,"name":"Анна Войтович","age":27,"gender":"female","city":"Львів","occupation":"Графічний дизайнер","income":"35000-50000","state_primary":"focus","state_secondary":"stress","lifestyle":"creative_professional","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Фрілансер-дизайнер."},
-  {"id":24,"name":"Петро Левицький","age":56,"gender":"male","city":"Львів","occupation":"Викладач","income":"35000-50000","state_primary":"sleep","state_secondary":"focus","lifestyle":"conscious_consumer","cbd_experience":"none","price_sensitivity":"medium","personality":"Науковий скептик."},
-  {"id":25,"name":"Христина Бойко","age":31,"gender":"female","city":"Львів","occupation":"Йога-інструктор","income":"20000-35000","state_primary":"recovery","state_secondary":"stress","lifestyle":"holistic_believer","cbd_experience":"experienced","price_sensitivity":"medium","personality":"Практикує йогу."},
-  {"id":26,"name":"Віталій Демченко","age":44,"gender":"male","city":"Львів","occupation":"Менеджер з продажу","income":"50000-75000","state_primary":"stress","state_secondary":"sleep","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Багато подорожує."},
-  {"id":27,"name":"Марина Павлюк","age":38,"gender":"female","city":"Львів","occupation":"Мама у декреті","income":"35000-50000","state_primary":"sleep","state_secondary":"stress","lifestyle":"conscious_consumer","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Мама маленької дитини."},
-  {"id":28,"name":"Олександра Коцюба","age":23,"gender":"female","city":"Львів","occupation":"Бариста","income":"до 20000","state_primary":"energy","state_secondary":"focus","lifestyle":"creative_professional","cbd_experience":"beginner","price_sensitivity":"very_high","personality":"Цікавиться функціональними напоями."},
-  {"id":29,"name":"Євген Дорошенко","age":51,"gender":"male","city":"Дніпро","occupation":"Інженер","income":"35000-50000","state_primary":"sleep","state_secondary":"recovery","lifestyle":"skeptic","cbd_experience":"none","price_sensitivity":"high","personality":"Прагматик, скептик."},
-  {"id":30,"name":"Ольга Кузьменко","age":36,"gender":"female","city":"Дніпро","occupation":"Підприємець","income":"50000-75000","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Веде e-commerce бізнес."},
-  {"id":31,"name":"Сергій Марченко","age":43,"gender":"male","city":"Дніпро","occupation":"Програміст","income":"75000-100000","state_primary":"focus","state_secondary":"stress","lifestyle":"biohacker","cbd_experience":"experienced","price_sensitivity":"low","personality":"Senior розробник."},
-  {"id":32,"name":"Надія Остапенко","age":59,"gender":"female","city":"Дніпро","occupation":"Головний бухгалтер","income":"50000-75000","state_primary":"stress","state_secondary":"sleep","lifestyle":"conscious_consumer","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Стрес під час звітності."},
-  {"id":33,"name":"Антон Шевчук","age":26,"gender":"male","city":"Дніпро","occupation":"Спортсмен MMA","income":"35000-50000","state_primary":"recovery","state_secondary":"sleep","lifestyle":"fitness_focused","cbd_experience":"experienced","price_sensitivity":"medium","personality":"Професійний боєць."},
-  {"id":34,"name":"Валентина Козак","age":64,"gender":"female","city":"Дніпро","occupation":"Пенсіонерка","income":"до 20000","state_primary":"sleep","state_secondary":"immunity","lifestyle":"holistic_believer","cbd_experience":"none","price_sensitivity":"very_high","personality":"Обмежений бюджет."},
-  {"id":35,"name":"Лариса Мельниченко","age":40,"gender":"female","city":"Одеса","occupation":"Ресторатор","income":"75000-100000","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"low","personality":"Власниця ресторану."},
-  {"id":36,"name":"Олексій Грищенко","age":33,"gender":"male","city":"Одеса","occupation":"Моряк","income":"100000+","state_primary":"sleep","state_secondary":"stress","lifestyle":"conscious_consumer","cbd_experience":"intermediate","price_sensitivity":"low","personality":"Працює на судні."},
-  {"id":37,"name":"Карина Іванова","age":29,"gender":"female","city":"Одеса","occupation":"SMM-менеджер","income":"35000-50000","state_primary":"focus","state_secondary":"stress","lifestyle":"creative_professional","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Працює з соцмережами."},
-  {"id":38,"name":"Віктор Черненко","age":57,"gender":"male","city":"Одеса","occupation":"Капітан порту","income":"50000-75000","state_primary":"sleep","state_secondary":"recovery","lifestyle":"skeptic","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Колишній моряк."},
-  {"id":39,"name":"Аліна Коломієць","age":45,"gender":"female","city":"Харків","occupation":"Викладач англійської","income":"35000-50000","state_primary":"stress","state_secondary":"focus","lifestyle":"conscious_consumer","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Живе в Харкові, стрес через війну."},
-  {"id":40,"name":"Денис Савчук","age":37,"gender":"male","city":"Харків","occupation":"IT-менеджер","income":"75000-100000","state_primary":"stress","state_secondary":"sleep","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"low","personality":"Керує IT-командою."},
-  {"id":41,"name":"Олена Кравчук","age":52,"gender":"female","city":"Харків","occupation":"Медсестра","income":"20000-35000","state_primary":"sleep","state_secondary":"stress","lifestyle":"holistic_believer","cbd_experience":"beginner","price_sensitivity":"high","personality":"Працює в лікарні."},
-  {"id":42,"name":"Юлія Данилюк","age":30,"gender":"female","city":"Вінниця","occupation":"Фармацевт","income":"35000-50000","state_primary":"energy","state_secondary":"focus","lifestyle":"wellness_enthusiast","cbd_experience":"experienced","price_sensitivity":"medium","personality":"Працює в аптеці."},
-  {"id":43,"name":"Павло Тимченко","age":46,"gender":"male","city":"Вінниця","occupation":"Фермер","income":"50000-75000","state_primary":"recovery","state_secondary":"sleep","lifestyle":"conscious_consumer","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Фізично важка робота."},
-  {"id":44,"name":"Світлана Бондар","age":54,"gender":"female","city":"Полтава","occupation":"Директор школи","income":"50000-75000","state_primary":"stress","state_secondary":"sleep","lifestyle":"conscious_consumer","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Керує школою."},
-  {"id":45,"name":"Ігор Ніколаєнко","age":28,"gender":"male","city":"Полтава","occupation":"Ветеринар","income":"35000-50000","state_primary":"stress","state_secondary":"energy","lifestyle":"wellness_enthusiast","cbd_experience":"intermediate","price_sensitivity":"medium","personality":"Цікавиться CBD."},
-  {"id":46,"name":"Марія Герасименко","age":68,"gender":"female","city":"Чернігів","occupation":"Пенсіонерка","income":"до 20000","state_primary":"sleep","state_secondary":"immunity","lifestyle":"holistic_believer","cbd_experience":"none","price_sensitivity":"very_high","personality":"Пережила окупацію."},
-  {"id":47,"name":"Андрій Коваль","age":35,"gender":"male","city":"Чернівці","occupation":"Митний брокер","income":"75000-100000","state_primary":"stress","state_secondary":"focus","lifestyle":"high_achiever","cbd_experience":"experienced","price_sensitivity":"low","personality":"Знає про легальність CBD."},
-  {"id":48,"name":"Тетяна Шульга","age":42,"gender":"female","city":"Черкаси","occupation":"Бухгалтер ФОП","income":"35000-50000","state_primary":"stress","state_secondary":"sleep","lifestyle":"conscious_consumer","cbd_experience":"beginner","price_sensitivity":"medium","personality":"Стрес під час звітності."},
-  {"id":49,"name":"Роман Іваненко","age":50,"gender":"male","city":"Суми","occupation":"Директор заводу","income":"100000+","state_primary":"stress","state_secondary":"energy","lifestyle":"high_achiever","cbd_experience":"intermediate","price_sensitivity":"very_low","personality":"Керує підприємством."},
-  {"id":50,"name":"Ганна Литвин","age":37,"gender":"female","city":"Житомир","occupation":"Вчителька","income":"20000-35000","state_primary":"stress","state_secondary":"energy","lifestyle":"holistic_believer","cbd_experience":"beginner","price_sensitivity":"high","personality":"Працює з дітьми."}
-]
-''')
+# Load personas (memory-mapped population if PERSONA_POPULATION is set)
+PERSONAS = load_personas()
+
+registry = PersonaRegistry(PERSONAS)
+
+MAX_BATCH_SIZE = int(os.environ.get("LLM_MAX_BATCH_SIZE", "25"))
+MAX_VARIANTS = int(os.environ.get("MAX_VARIANTS", "10"))
 
 # Models
 class HypothesisRequest(BaseModel):
@@ -85,97 +70,234 @@ class HypothesisRequest(BaseModel):
     question_type: str = "scale"
     options: Optional[List[str]] = None
     segments: Optional[Dict[str, Any]] = None
+    cache: Literal["use", "bypass", "refresh"] = "use"
+    # Personas per Claude call; 1 = one call per persona
+    batch_size: int = Field(default=1, ge=1, le=MAX_BATCH_SIZE)
+    # "simulate_bulk": vectorized Monte Carlo over `samples` simulated respondents
+    mode: Literal["auto", "simulate_bulk"] = "auto"
+    samples: int = Field(default=10000, ge=1, le=MAX_SAMPLES)
+    seed: Optional[int] = None
+    # Extra persona attributes to break results down by, e.g. ["gender", "age_band"]
+    crosstab: Optional[List[str]] = None
+    # Include per-stage timings (filter, fan_out, persona_call, ...) in the /api/test response
+    timings: bool = False
     
     class Config:
         extra = "ignore"
 
+class TestVariant(BaseModel):
+    hypothesis: str
+    options: Optional[List[str]] = None
+    name: Optional[str] = None
+
+
+class BatchTestRequest(BaseModel):
+    """Several hypotheses asked of the same personas; shared fields as in HypothesisRequest"""
+    variants: List[Union[str, TestVariant]] = Field(min_length=2, max_length=MAX_VARIANTS)
+    question_type: str = "scale"
+    options: Optional[List[str]] = None
+    segments: Optional[Dict[str, Any]] = None
+    cache: Literal["use", "bypass", "refresh"] = "use"
+    batch_size: int = Field(default=1, ge=1, le=MAX_BATCH_SIZE)
+    crosstab: Optional[List[str]] = None
+    
+    class Config:
+        extra = "ignore"
+    
+    def variant_requests(self) -> List[Tuple[str, HypothesisRequest]]:
+        shared = self.model_dump(exclude={"variants", "options"})
+        variants = []
+        for i, v in enumerate(self.variants):
+            if isinstance(v, str):
+                v = TestVariant(hypothesis=v)
+            name = v.name or chr(ord("A") + i)
+            request = HypothesisRequest(**shared, hypothesis=v.hypothesis, options=v.options or self.options)
+            variants.append((name, request))
+        return variants
+
 class TestResult(BaseModel):
     id: str
     hypothesis: str
     created_at: str
     results: Dict[str, Any]
 
-# Storage (in production use PostgreSQL)
-test_results: List[Dict] = []
+# Storage (SQLite by default, see RESULT_STORE_URL)
+result_store = create_store()
+
+LLM_IN_FLIGHT.set_function(lambda: llm_client.in_flight)
+CIRCUIT_OPEN.set_function(lambda: llm_client.breaker.state != "closed")
+RESULT_STORE_SIZE.set_function(lambda: result_store.count())
 
-# Claude API
-ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+JSON_OBJECT_RE = re.compile(r'\{[^}]+\}')
+JSON_ARRAY_RE = re.compile(r'\[.*\]', re.DOTALL)
 
-async def query_claude(persona: dict, hypothesis: str, question_type: str, options: List[str] = None) -> dict:
-    """Query Claude API as a specific persona"""
+
+def parse_json(pattern: re.Pattern, text: str) -> Any:
+    """First JSON value matching pattern in the model output, or None"""
+    match = pattern.search(text)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group())
+    except ValueError:
+        return None
+
+async def query_claude(persona: dict, hypothesis: str, question_type: str, options: List[str] = None,
+                       cache: str = "use") -> dict:
+    """Query Claude API as a specific persona
+
+    cache: "use" reads and writes the response cache, "bypass" skips it
+    entirely, "refresh" skips the read but stores the fresh answer.
+    Every response carries "source": "llm", "cached" or "simulated"; a
+    simulated fallback after a failed call also carries "fallback_reason".
+    """
     
     if not ANTHROPIC_API_KEY:
         # Fallback to rule-based simulation
         return simulate_response(persona, hypothesis, question_type, options)
     
-    system_prompt = f"""Ти — {persona['name']}, {persona['age']} років, {persona['gender']}, живеш у місті {persona['city']}.
+    key = cache_key(persona, hypothesis, question_type, options, CLAUDE_MODEL, PROMPT_VERSION)
+    if cache == "use":
+        cached = response_cache.get(key)
+        if cached is not None:
+            cached["source"] = "cached"
+            return cached
+    
+    system_prompt, user_prompt = prompt_builder.single(persona, hypothesis, question_type, options)
 
-Твій профіль:
-- Професія: {persona['occupation']}
-- Дохід: {persona['income']} грн/міс
-- Головна проблема зі здоров'ям: {persona['state_primary']}
-- Досвід з CBD: {persona['cbd_experience']}
-- Чутливість до ціни: {persona['price_sensitivity']}
-- Характер: {persona['personality']}
+    try:
+        with span("upstream"):
+            response = await llm_client.post_messages({
+                "model": CLAUDE_MODEL,
+                "max_tokens": 150,
+                "system": system_prompt,
+                "messages": [{"role": "user", "content": user_prompt}]
+            })
+        
+        if response.status_code == 200:
+            with span("parse"):
+                data = response.json()
+                record_usage(data.get("usage"))
+                text = data["content"][0]["text"]
+                result = parse_json(JSON_OBJECT_RE, text)
+            if isinstance(result, dict):
+                result["persona_id"] = persona["id"]
+                result["persona_name"] = persona["name"]
+                result["source"] = "llm"
+                if cache != "bypass":
+                    response_cache.set(key, result)
+                return result
+            PARSE_FAILURES.inc(kind="single")
+            logger.warning("llm_parse_failed", extra={"persona_id": persona["id"], "output": text[:200]})
+            reason = "unparseable"
+        else:
+            reason = f"http_{response.status_code}"
+    except CircuitOpenError:
+        reason = "circuit_open"
+    except Exception as e:
+        logger.warning("llm_call_failed",
+                       extra={"persona_id": persona["id"], "error_type": type(e).__name__, "error": str(e)})
+        reason = "error"
+    
+    result = simulate_response(persona, hypothesis, question_type, options)
+    result["fallback_reason"] = reason
+    return result
 
-Відповідай ТІЛЬКИ від імені цієї людини. Будь чесним. Українською мовою."""
 
+def valid_answer(answer: Any, question_type: str, options: List[str] = None) -> bool:
+    if not isinstance(answer, dict):
+        return False
     if question_type == "scale":
-        user_prompt = f"""Питання: {hypothesis}
-
-Оціни за шкалою від 1 до 10:
-1 = категорично не згоден / зовсім не цікаво
-10 = повністю згоден / дуже цікаво
-
-Відповідь ТІЛЬКИ у форматі JSON: {{"score": число, "reasoning": "1 речення чому"}}"""
-    else:
-        user_prompt = f"""Питання: {hypothesis}
+        score = answer.get("score")
+        return isinstance(score, int) and not isinstance(score, bool) and 1 <= score <= 10
+    choice = answer.get("choice")
+    return isinstance(choice, int) and not isinstance(choice, bool) and 1 <= choice <= max(len(options or []), 1)
 
-Варіанти:
-{chr(10).join([f"{i+1}. {opt}" for i, opt in enumerate(options or [])])}
 
-Відповідь ТІЛЬКИ у форматі JSON: {{"choice": номер, "reasoning": "1 речення чому"}}"""
+async def query_claude_batch(personas: List[dict], hypothesis: str, question_type: str, options: List[str] = None,
+                             cache: str = "use") -> List[dict]:
+    """Ask several personas in one Messages API call.
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": ANTHROPIC_API_KEY,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json"
-                },
-                json={
-                    "model": "claude-sonnet-4-20250514",
-                    "max_tokens": 150,
+    The model returns a JSON array keyed by persona_id; any persona that is
+    missing or malformed in that array is re-asked through query_claude.
+    Responses are returned in the same order as personas.
+    """
+    
+    if not ANTHROPIC_API_KEY:
+        return [simulate_response(p, hypothesis, question_type, options) for p in personas]
+    
+    answers: Dict[int, dict] = {}
+    keys = {p["id"]: cache_key(p, hypothesis, question_type, options, CLAUDE_MODEL, PROMPT_VERSION)
+            for p in personas}
+    if cache == "use":
+        for p in personas:
+            cached = response_cache.get(keys[p["id"]])
+            if cached is not None:
+                cached["source"] = "cached"
+                answers[p["id"]] = cached
+    
+    pending = [p for p in personas if p["id"] not in answers]
+    if len(pending) == 1:
+        answers[pending[0]["id"]] = await query_claude(pending[0], hypothesis, question_type, options, cache)
+        pending = []
+    
+    if pending:
+        system_prompt, user_prompt = prompt_builder.batch(pending, hypothesis, question_type, options)
+        
+        try:
+            with span("upstream"):
+                response = await llm_client.post_messages({
+                    "model": CLAUDE_MODEL,
+                    "max_tokens": 150 * len(pending),
                     "system": system_prompt,
                     "messages": [{"role": "user", "content": user_prompt}]
-                },
-                timeout=30.0
-            )
+                })
             
             if response.status_code == 200:
-                data = response.json()
-                text = data["content"][0]["text"]
-                # Parse JSON from response
-                import re
-                json_match = re.search(r'\{[^}]+\}', text)
-                if json_match:
-                    result = json.loads(json_match.group())
-                    result["persona_id"] = persona["id"]
-                    result["persona_name"] = persona["name"]
-                    return result
-    except Exception as e:
-        print(f"Claude API error: {e}")
+                with span("parse"):
+                    data = response.json()
+                    record_usage(data.get("usage"))
+                    text = data["content"][0]["text"]
+                    items = parse_json(JSON_ARRAY_RE, text)
+                if not isinstance(items, list):
+                    PARSE_FAILURES.inc(kind="batch")
+                    logger.warning("llm_batch_parse_failed",
+                                   extra={"personas": len(pending), "output": text[:200]})
+                    items = []
+                by_id = {p["id"]: p for p in pending}
+                for item in items:
+                    if not valid_answer(item, question_type, options):
+                        continue
+                    persona = by_id.get(item.get("persona_id"))
+                    if persona is None or persona["id"] in answers:
+                        continue
+                    item["persona_name"] = persona["name"]
+                    item["source"] = "llm"
+                    answers[persona["id"]] = item
+                    if cache != "bypass":
+                        response_cache.set(keys[persona["id"]], item)
+        except CircuitOpenError:
+            pass
+        except Exception as e:
+            logger.warning("llm_batch_call_failed",
+                           extra={"personas": len(pending), "error_type": type(e).__name__, "error": str(e)})
+        
+        missing = [p for p in pending if p["id"] not in answers]
+        if missing:
+            singles = await asyncio.gather(*[
+                query_claude(p, hypothesis, question_type, options, cache) for p in missing
+            ])
+            for p, r in zip(missing, singles):
+                answers[p["id"]] = r
     
-    return simulate_response(persona, hypothesis, question_type, options)
+    return [answers[p["id"]] for p in personas]
 
 
 def simulate_response(persona: dict, hypothesis: str, question_type: str, options: List[str] = None) -> dict:
     """Rule-based simulation when API is not available"""
     import random
     
-    hypothesis_lower = hypothesis.lower()
+    features = parse_hypothesis(hypothesis)
     
     price_high = persona["price_sensitivity"] in ["very_high", "high"]
     price_low = persona["price_sensitivity"] in ["low", "very_low"]
@@ -189,37 +311,37 @@ def simulate_response(persona: dict, hypothesis: str, question_type: str, option
         base_score = 5.5
         
         # Price/discount mentions
-        if "знижк" in hypothesis_lower or "акці" in hypothesis_lower or "ціна" in hypothesis_lower:
+        if features["price"]:
             if price_high: base_score += 2.5
             if price_low: base_score -= 0.5
         
         # Subscription
-        if "підписк" in hypothesis_lower:
+        if features["subscription"]:
             if experienced: base_score += 1.5
             if beginner: base_score -= 1.5
             if young: base_score += 1
             if older: base_score -= 1
         
         # Experience Center / store
-        if "experience" in hypothesis_lower or "магазин" in hypothesis_lower or "офлайн" in hypothesis_lower:
+        if features["store"]:
             if kyiv: base_score += 2
             else: base_score -= 1.5
         
         # New product
-        if "новий" in hypothesis_lower or "продукт" in hypothesis_lower:
+        if features["new_product"]:
             if experienced: base_score += 0.5
             if beginner: base_score += 1.5
         
         # Sleep related
-        if "сон" in hypothesis_lower or "sleep" in hypothesis_lower:
+        if features["sleep"]:
             if persona["state_primary"] == "sleep": base_score += 2
         
         # Stress related  
-        if "стрес" in hypothesis_lower or "stress" in hypothesis_lower:
+        if features["stress"]:
             if persona["state_primary"] == "stress": base_score += 2
         
         # Focus related
-        if "фокус" in hypothesis_lower or "концентрац" in hypothesis_lower:
+        if features["focus"]:
             if persona["state_primary"] == "focus": base_score += 2
         
         # Random factor
@@ -231,22 +353,23 @@ def simulate_response(persona: dict, hypothesis: str, question_type: str, option
             "score": score,
             "reasoning": "Симульована відповідь на основі профілю",
             "persona_id": persona["id"],
-            "persona_name": persona["name"]
+            "persona_name": persona["name"],
+            "source": "simulated"
         }
     
     else:  # choice
         if not options:
-            return {"choice": 1, "persona_id": persona["id"], "persona_name": persona["name"]}
+            return {"choice": 1, "persona_id": persona["id"], "persona_name": persona["name"], "source": "simulated"}
         
         weights = [1.0] * len(options)
         
         for i, opt in enumerate(options):
-            opt_lower = opt.lower()
-            if ("дорог" in opt_lower or "премі" in opt_lower) and price_low:
+            opt_features = parse_option(opt)
+            if opt_features["premium"] and price_low:
                 weights[i] += 2
-            if ("дешев" in opt_lower or "економ" in opt_lower or "бюджет" in opt_lower) and price_high:
+            if opt_features["budget"] and price_high:
                 weights[i] += 2
-            if ("підписк" in opt_lower) and experienced:
+            if opt_features["subscription"] and experienced:
                 weights[i] += 1.5
         
         total = sum(weights)
@@ -264,141 +387,419 @@ def simulate_response(persona: dict, hypothesis: str, question_type: str, option
             "choice_text": options[choice_idx],
             "reasoning": "Симульована відповідь",
             "persona_id": persona["id"],
-            "persona_name": persona["name"]
+            "persona_name": persona["name"],
+            "source": "simulated"
         }
 
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "personas": len(PERSONAS)}
+    return {"status": "ok", "personas": len(PERSONAS), "llm": llm_client.stats(),
+            "cache": response_cache.stats(), "jobs": job_manager.stats(),
+            "results": result_store.count(),
+            "prompts": prompt_builder.stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_registry.expose(), headers={"Content-Type": METRICS_CONTENT_TYPE})
 
 
 @app.get("/api/personas")
-async def get_personas():
-    return {"personas": PERSONAS, "total": len(PERSONAS)}
+async def get_personas(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    return {"personas": PERSONAS[offset:offset + limit], "total": len(PERSONAS)}
 
 
 @app.get("/api/segments")
-async def get_segments():
-    states = list(set(p["state_primary"] for p in PERSONAS))
-    lifestyles = list(set(p["lifestyle"] for p in PERSONAS))
-    cities = list(set(p["city"] for p in PERSONAS))
+async def get_segments(request: Request):
+    headers = {"ETag": registry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), registry.etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(registry.segments, headers=headers)
+
+
+def filter_personas(request: HypothesisRequest) -> np.ndarray:
+    """Positions of the matching personas in PERSONAS; rows become dicts only when asked"""
+    with span("filter"):
+        filtered = registry.filter_indices(request.segments)
     
-    return {
-        "states": states,
-        "lifestyles": lifestyles,
-        "cities": cities,
-        "state_labels": {
-            "stress": "Стрес", "sleep": "Сон", "energy": "Енергія",
-            "focus": "Фокус", "immunity": "Імунітет", "recovery": "Відновлення"
-        },
-        "lifestyle_labels": {
-            "high_achiever": "High Achievers", "creative_professional": "Креативні",
-            "biohacker": "Біохакери", "wellness_enthusiast": "Wellness",
-            "fitness_focused": "Фітнес", "holistic_believer": "Холістики",
-            "conscious_consumer": "Свідомі споживачі", "skeptic": "Скептики"
-        }
+    if len(filtered) == 0:
+        raise HTTPException(status_code=400, detail="No personas match filters")
+    
+    return filtered
+
+
+def new_aggregator(request: HypothesisRequest) -> ResponseAggregator:
+    return ResponseAggregator(request.question_type, crosstab=request.crosstab)
+
+
+def aggregate_results(request: HypothesisRequest, responses: List[dict], filtered: List[dict]) -> dict:
+    """Aggregate responses; responses[i] must belong to filtered[i]"""
+    with span("aggregate"):
+        aggregator = new_aggregator(request)
+        for r, p in zip(responses, filtered):
+            aggregator.add(r, p)
+        return aggregator.result()
+
+
+def persona_batches(request: HypothesisRequest, personas: Sequence) -> List[Sequence]:
+    """Split persona dicts (or PERSONAS positions) into request.batch_size chunks"""
+    size = request.batch_size
+    return [personas[i:i + size] for i in range(0, len(personas), size)]
+
+
+async def ask_personas(request: HypothesisRequest, personas: List[dict]) -> List[dict]:
+    with span("persona_call"):
+        if len(personas) == 1:
+            responses = [await query_claude(personas[0], request.hypothesis, request.question_type,
+                                            request.options, request.cache)]
+        else:
+            responses = await query_claude_batch(personas, request.hypothesis, request.question_type,
+                                                 request.options, request.cache)
+    for r in responses:
+        RESPONSES.inc(source=r.get("source", "unknown"))
+        if r.get("fallback_reason"):
+            FALLBACKS.inc(reason=r["fallback_reason"])
+    return responses
+
+
+async def iter_responses(request: HypothesisRequest, indices: np.ndarray) -> AsyncIterator[Tuple[dict, dict]]:
+    """Yield (persona, response) pairs in completion order.
+
+    Persona dicts are built per batch when its call starts. Outstanding
+    calls are cancelled if the consumer stops early (client disconnect,
+    job cancellation).
+    """
+    async def ask(batch: np.ndarray):
+        personas = registry.rows(batch)
+        return personas, await ask_personas(request, personas)
+    
+    tasks = [asyncio.ensure_future(ask(b)) for b in persona_batches(request, indices)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            batch, batch_responses = await next_done
+            for pair in zip(batch, batch_responses):
+                yield pair
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def track_usage() -> TokenUsage:
+    """Start counting Claude token usage (incl. prompt-cache reads/writes) for this test"""
+    usage = TokenUsage()
+    current_usage.set(usage)
+    return usage
+
+
+def usage_result(usage: TokenUsage, batch_size: int) -> Dict[str, Any]:
+    """results["usage"]; says why cache reads are 0 when every call is single-persona"""
+    data = usage.as_dict()
+    if batch_size == 1 and prompt_builder.cache_prefix:
+        data["prompt_cache_note"] = SINGLE_CALL_CACHE_NOTE
+    return data
+
+
+def store_result(request: HypothesisRequest, results: dict, responses: List[dict]) -> dict:
+    now = datetime.now()
+    test_id = f"test_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    test_record = {
+        "id": test_id,
+        "hypothesis": request.hypothesis,
+        "created_at": now.isoformat(),
+        "results": results
     }
+    with span("store"):
+        result_store.add(test_record, responses, request.model_dump(exclude={"timings"}))
+    return test_record
+
+
+def run_bulk_simulation(request: HypothesisRequest, filtered: np.ndarray) -> dict:
+    results = simulate_bulk(PERSONAS, request.hypothesis, request.question_type, request.options,
+                            samples=request.samples, seed=request.seed, indices=filtered)
+    return store_result(request, results, results["responses"])
 
 
 @app.post("/api/test")
 async def run_test(request: HypothesisRequest):
-    # Filter personas
-    filtered = PERSONAS.copy()
-    
-    if request.segments:
-        if request.segments.get("state"):
-            filtered = [p for p in filtered if p["state_primary"] in request.segments["state"]]
-        if request.segments.get("lifestyle"):
-            filtered = [p for p in filtered if p["lifestyle"] in request.segments["lifestyle"]]
-        if request.segments.get("city"):
-            filtered = [p for p in filtered if p["city"] in request.segments["city"]]
+    trace = start_trace("test")
+    filtered = filter_personas(request)
     
-    if not filtered:
-        raise HTTPException(status_code=400, detail="No personas match filters")
+    if request.mode == "simulate_bulk":
+        with span("simulate_bulk"):
+            record = await asyncio.to_thread(run_bulk_simulation, request, filtered)
+    else:
+        usage = track_usage()
+        
+        personas = registry.rows(filtered)
+        
+        # Run queries (parallel)
+        with span("fan_out"):
+            tasks = [ask_personas(request, batch) for batch in persona_batches(request, personas)]
+            responses = [r for batch in await asyncio.gather(*tasks) for r in batch]
+        
+        results = aggregate_results(request, responses, personas)
+        results["usage"] = usage_result(usage, request.batch_size)
+        record = store_result(request, results, responses)
     
-    # Run queries (parallel)
-    tasks = [
-        query_claude(p, request.hypothesis, request.question_type, request.options)
-        for p in filtered
-    ]
-    responses = await asyncio.gather(*tasks)
+    TEST_SECONDS.observe(trace.elapsed(), mode=request.mode)
+    timings = trace.timings()
+    logger.info("test_completed", extra={
+        "test_id": record["id"], "mode": request.mode, "personas": len(filtered),
+        "duration_ms": timings["total_ms"], "sources": record["results"].get("sources"),
+        "stages": {stage: s["total_ms"] for stage, s in timings["stages"].items()},
+    })
+    if request.timings:
+        record = {**record, "timings": timings}
+    return record
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/test/stream")
+async def run_test_stream(request: HypothesisRequest):
+    """Same as /api/test, but streams each persona answer as Server-Sent Events.
+
+    Events: "response" per persona (with running aggregate), then one
+    "summary" carrying the stored TestResult.
+    """
+    filtered = filter_personas(request)
     
-    # Aggregate results
-    if request.question_type == "scale":
-        scores = [r["score"] for r in responses if "score" in r]
-        avg = sum(scores) / len(scores) if scores else 0
+    async def events():
+        start_trace("test_stream")
+        if request.mode == "simulate_bulk":
+            yield sse_event("summary", await asyncio.to_thread(run_bulk_simulation, request, filtered))
+            return
         
-        distribution = [0] * 10
-        for s in scores:
-            distribution[s - 1] += 1
-        
-        by_state = {}
-        by_lifestyle = {}
-        for r, p in zip(responses, filtered):
-            state = p["state_primary"]
-            lifestyle = p["lifestyle"]
-            score = r.get("score", 5)
+        usage = track_usage()
+        aggregator = new_aggregator(request)
+        done_responses: List[dict] = []
+        async for persona, response in iter_responses(request, filtered):
+            aggregator.add(response, persona)
+            done_responses.append(response)
             
-            if state not in by_state:
-                by_state[state] = []
-            by_state[state].append(score)
-            
-            if lifestyle not in by_lifestyle:
-                by_lifestyle[lifestyle] = []
-            by_lifestyle[lifestyle].append(score)
+            yield sse_event("response", {
+                "done": len(done_responses),
+                "total": len(filtered),
+                "response": response,
+                "aggregate": aggregator.result(include_sample=False)
+            })
         
-        results = {
-            "type": "scale",
-            "total": len(responses),
-            "average": round(avg, 1),
-            "distribution": [{"score": i+1, "count": c, "pct": round(c/len(scores)*100, 1)} for i, c in enumerate(distribution)],
-            "positive": len([s for s in scores if s >= 7]),
-            "neutral": len([s for s in scores if 4 <= s < 7]),
-            "negative": len([s for s in scores if s < 4]),
-            "by_state": [{"state": k, "avg": round(sum(v)/len(v), 1), "count": len(v)} for k, v in by_state.items()],
-            "by_lifestyle": [{"lifestyle": k, "avg": round(sum(v)/len(v), 1), "count": len(v)} for k, v in by_lifestyle.items()],
-            "responses": responses[:10]  # Sample
-        }
+        results = aggregator.result()
+        results["usage"] = usage_result(usage, request.batch_size)
+        yield sse_event("summary", store_result(request, results, done_responses))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def run_interleaved(work: List[List[Tuple[HypothesisRequest, List[dict]]]],
+                          concurrency: int) -> List[List[List[dict]]]:
+    """Run per-variant lists of (request, persona batch) items through one worker pool.
+
+    Items are taken round-robin across variants (A1, B1, C1, A2, ...), so
+    every variant progresses at the same rate and none waits behind another.
+    The global LLM semaphore still bounds calls across all tests.
+    """
+    results: List[List[Optional[List[dict]]]] = [[None] * len(items) for items in work]
+    order = [(v, i) for i in range(max(len(items) for items in work))
+             for v, items in enumerate(work) if i < len(items)]
+    queue = iter(order)
+    
+    async def worker():
+        for v, i in queue:
+            request, batch = work[v][i]
+            results[v][i] = await ask_personas(request, batch)
+    
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(order)))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+    return results
+
+
+def compare_variants(baseline: Tuple[str, HypothesisRequest, List[dict]],
+                     variant: Tuple[str, HypothesisRequest, List[dict]],
+                     personas: List[dict], crosstab: Optional[List[str]]) -> dict:
+    base_name, base_request, base_responses = baseline
+    name, request, responses = variant
+    comparison: Dict[str, Any] = {"variant": name, "baseline": base_name}
+    
+    if request.question_type == "scale":
+        paired = PairedComparison(crosstab)
+        for persona, a, b in zip(personas, base_responses, responses):
+            score_a, score_b = parse_score(a), parse_score(b)
+            if score_a is not None and score_b is not None:
+                paired.add(score_b - score_a, persona)
+        comparison.update(paired.result())
     else:
-        choice_counts = {}
-        for r in responses:
-            choice = r.get("choice_text", r.get("choice", "Unknown"))
-            choice_counts[choice] = choice_counts.get(choice, 0) + 1
+        # Answers are paired by option position (variants may word the
+        # options differently) and reported under the baseline's wording
+        base_options, options = base_request.options or [], request.options or []
         
-        results = {
-            "type": "choice",
-            "total": len(responses),
-            "choices": [{"choice": k, "count": v, "pct": round(v/len(responses)*100, 1)} for k, v in choice_counts.items()],
-            "responses": responses[:10]
-        }
+        def choice(r: dict) -> Any:
+            position = r.get("choice")
+            if not isinstance(position, int) or isinstance(position, bool):
+                return "Unknown"
+            if not base_options:
+                return position
+            return base_options[position - 1] if 1 <= position <= len(base_options) else "Unknown"
+        
+        paired = PairedChoiceComparison(crosstab)
+        for persona, a, b in zip(personas, base_responses, responses):
+            paired.add(choice(a), choice(b), persona)
+        comparison.update(paired.result())
+        if options != base_options:
+            comparison["options"] = [{"position": i + 1, "baseline": a, "variant": b}
+                                     for i, (a, b) in enumerate(zip(base_options, options))]
+    return comparison
+
+
+@app.post("/api/test/batch")
+async def run_batch_test(batch: BatchTestRequest):
+    """A/B test several hypotheses on the same personas.
+
+    Each variant is aggregated and stored like a regular /api/test result;
+    comparisons pair every persona's answer to a variant with its answer to
+    the first variant (baseline) and test the difference per segment.
+    Choice variants may word their options differently but must have as
+    many of them: answers are paired by option position.
+    """
+    start_trace("test_batch")
+    variants = batch.variant_requests()
+    if batch.question_type != "scale" and len({len(r.options or []) for _, r in variants}) > 1:
+        raise HTTPException(status_code=400,
+                            detail="Choice variants must have the same number of options "
+                                   "(answers are compared by option position)")
+    filtered = registry.rows(filter_personas(variants[0][1]))
+    usage = track_usage()
     
-    # Store result
-    test_id = f"test_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    test_record = {
-        "id": test_id,
-        "hypothesis": request.hypothesis,
-        "created_at": datetime.now().isoformat(),
-        "results": results
+    work = [[(request, b) for b in persona_batches(request, filtered)] for _, request in variants]
+    batch_results = await run_interleaved(work, llm_client.max_concurrency)
+    
+    answered = []
+    tests = []
+    for (name, request), chunks in zip(variants, batch_results):
+        responses = [r for chunk in chunks for r in chunk]
+        results = aggregate_results(request, responses, filtered)
+        tests.append({"variant": name, **store_result(request, results, responses)})
+        answered.append((name, request, responses))
+    
+    return {
+        "variants": tests,
+        "comparisons": [compare_variants(answered[0], v, filtered, batch.crosstab) for v in answered[1:]],
+        "personas": len(filtered),
+        "usage": usage_result(usage, batch.batch_size)
     }
-    test_results.append(test_record)
+
+
+async def run_job(job: Job) -> dict:
+    request: HypothesisRequest = job.request
+    start_trace("job")
+    filtered = filter_personas(request)
+    if request.mode == "simulate_bulk":
+        record = await asyncio.to_thread(run_bulk_simulation, request, filtered)
+        # One vectorized step: no per-persona progress to report along the way
+        job.done = job.total
+        return record
+    usage = track_usage()
+    job.aggregate = new_aggregator(request)
+    async for persona, response in iter_responses(request, filtered):
+        job.add(response)
+        job.aggregate.add(response, persona)
+    results = job.aggregate.result()
+    results["usage"] = usage_result(usage, request.batch_size)
+    return store_result(request, results, job.responses)
+
+
+job_manager = JobManager(run_job)
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: HypothesisRequest):
+    """Queue a test and return immediately; poll GET /api/jobs/{id}"""
+    filtered = filter_personas(request)
+    try:
+        job = job_manager.submit(request, total=len(filtered))
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return job.summary()
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
     
-    return test_record
+    data = job.summary()
+    if job.result_id is not None:
+        record = result_store.get(job.result_id)
+        if record is not None:
+            data["result"] = {k: v for k, v in record.items() if k not in ("request", "responses")}
+    elif job.partial is not None:
+        data["partial"] = job.partial
+    elif job.aggregate is not None and job.done:
+        data["partial"] = job.aggregate.result()
+    return data
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.summary()
 
 
 @app.get("/api/results")
-async def get_results():
-    return {"results": test_results}
+async def get_results(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None, q: Optional[str] = None):
+    try:
+        results, next_cursor = result_store.list(limit=limit, cursor=cursor, q=q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results, "next_cursor": next_cursor}
+
+
+@app.get("/api/results/{test_id}")
+async def get_result(test_id: str):
+    record = result_store.get(test_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return record
 
 
 # Serve frontend in production
 frontend_path = os.path.join(os.path.dirname(__file__), "..", "frontend", "build")
 if os.path.exists(frontend_path):
-    app.mount("/static", StaticFiles(directory=os.path.join(frontend_path, "static")), name="static")
+    # Indexed once: every request below is a dict lookup, never a disk stat
+    frontend = StaticManifest(frontend_path)
     
-    @app.get("/{full_path:path}")
-    async def serve_frontend(full_path: str):
-        file_path = os.path.join(frontend_path, full_path)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            return FileResponse(file_path)
-        return FileResponse(os.path.join(frontend_path, "index.html"))
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"])
+    async def serve_frontend(full_path: str, request: Request):
+        entry = frontend.lookup(full_path)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        
+        encoding, body, etag = entry.negotiate(request.headers.get("accept-encoding"))
+        headers = {"ETag": etag, "Cache-Control": entry.cache_control}
+        if entry.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        
+        headers["Content-Type"] = entry.content_type
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        if body is None:
+            return FileResponse(entry.path, headers=headers)
+        return Response(body, headers=headers)
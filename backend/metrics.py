@@ -0,0 +1,177 @@
+"""
+Prometheus metrics in the text exposition format (no client library needed)
+"""
+import math
+from typing import Optional, List, Dict, Any, Callable, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += self.samples()
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if not self.labelnames and not self._values:
+            return [f"{self.name} 0"]
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                for key, v in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Set directly, or read from `function` at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function = function
+
+    def set(self, value: float):
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def value(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.value())}"]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> ([count per bucket (non-cumulative), +Inf last], sum)
+        self._series: Dict[Tuple, List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        return "\n".join(m.expose() for m in self._metrics.values()) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+UPSTREAM_LATENCY = metrics_registry.register(Histogram(
+    "focus_group_upstream_request_seconds", "Anthropic Messages API call latency by HTTP status",
+    ["status"]))
+UPSTREAM_RETRIES = metrics_registry.register(Counter(
+    "focus_group_upstream_retries_total", "Messages API calls retried after 429/5xx or transport errors"))
+UPSTREAM_HEDGED = metrics_registry.register(Counter(
+    "focus_group_upstream_hedged_total", "Duplicate (hedged) Messages API calls sent"))
+LLM_IN_FLIGHT = metrics_registry.register(Gauge(
+    "focus_group_llm_in_flight", "Messages API calls currently in flight"))
+CIRCUIT_OPEN = metrics_registry.register(Gauge(
+    "focus_group_llm_circuit_open", "1 while the upstream circuit breaker is not closed"))
+RESPONSES = metrics_registry.register(Counter(
+    "focus_group_responses_total", "Persona responses by source (llm, cached, simulated)", ["source"]))
+FALLBACKS = metrics_registry.register(Counter(
+    "focus_group_fallbacks_total", "Responses simulated after a failed LLM call, by reason", ["reason"]))
+PARSE_FAILURES = metrics_registry.register(Counter(
+    "focus_group_parse_failures_total", "Model outputs that could not be parsed (single, batch)", ["kind"]))
+STAGE_SECONDS = metrics_registry.register(Histogram(
+    "focus_group_stage_seconds", "Time spent per pipeline stage", ["stage"]))
+TEST_SECONDS = metrics_registry.register(Histogram(
+    "focus_group_test_seconds", "End-to-end /api/test duration by mode", ["mode"]))
+RESULT_STORE_SIZE = metrics_registry.register(Gauge(
+    "focus_group_result_store_size", "Stored test results"))
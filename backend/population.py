@@ -0,0 +1,222 @@
+"""
+Synthetic persona populations in compact columnar storage
+
+Generate a population (marginals are taken from the 50 seed personas,
+which were built from GA4 data) and save it next to the backend:
+
+    python population.py --size 100000 --seed 42 --out data/population
+
+then start the API with PERSONA_POPULATION=data/population.
+"""
+import argparse
+import json
+import os
+from typing import Optional, List, Dict, Any, Iterator, Tuple, Union
+
+import numpy as np
+
+SEED_PERSONAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+# Path prefix of a generated population (<prefix>.npy + <prefix>.vocab.json); empty = seed personas
+PERSONA_POPULATION = os.environ.get("PERSONA_POPULATION", "")
+
+CATEGORICAL_FIELDS = [
+    "name", "gender", "city", "occupation", "income", "state_primary", "state_secondary",
+    "lifestyle", "cbd_experience", "price_sensitivity", "personality",
+]
+
+DTYPE = np.dtype([("id", "<u4"), ("age", "u1")] + [(f, "<u2") for f in CATEGORICAL_FIELDS])
+
+# GA4 reports age in these bands; ages are drawn uniformly inside a band
+GA4_AGE_BANDS = [(18, 24), (25, 34), (35, 44), (45, 54), (55, 64)]
+
+
+class PersonaTable:
+    """Read-only sequence of personas over a structured array.
+
+    Categorical fields are stored as uint16 codes into a per-field
+    vocabulary; rows become dicts only when indexed, so a memory-mapped
+    table costs almost nothing until it is used.
+    """
+
+    def __init__(self, data: np.ndarray, vocab: Dict[str, List[str]]):
+        self.data = data
+        self.vocab = vocab
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[dict, List[dict]]:
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def row(self, i: int) -> dict:
+        rec = self.data[i]
+        persona = {"id": int(rec["id"]), "age": int(rec["age"])}
+        for field in CATEGORICAL_FIELDS:
+            persona[field] = self.vocab[field][rec[field]]
+        return persona
+
+    def codes(self, field: str) -> Tuple[np.ndarray, List[str]]:
+        return self.data[field], self.vocab[field]
+
+    def column(self, field: str) -> np.ndarray:
+        if field in self.vocab:
+            return np.asarray(self.vocab[field], dtype=object)[self.data[field]]
+        return np.asarray(self.data[field])
+
+    @classmethod
+    def from_dicts(cls, personas: List[dict]) -> "PersonaTable":
+        data = np.zeros(len(personas), dtype=DTYPE)
+        data["id"] = [p["id"] for p in personas]
+        data["age"] = [p["age"] for p in personas]
+        vocab = {}
+        for field in CATEGORICAL_FIELDS:
+            labels, codes = np.unique([p[field] for p in personas], return_inverse=True)
+            vocab[field] = labels.tolist()
+            data[field] = codes
+        return cls(data, vocab)
+
+    def save(self, prefix: str):
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+        np.save(prefix + ".npy", self.data)
+        with open(prefix + ".vocab.json", "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "PersonaTable":
+        data = np.load(prefix + ".npy", mmap_mode="r" if mmap else None)
+        with open(prefix + ".vocab.json", encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(data, vocab)
+
+
+def load_seed_personas() -> List[dict]:
+    with open(SEED_PERSONAS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_personas(prefix: str = PERSONA_POPULATION) -> PersonaTable:
+    if prefix:
+        return PersonaTable.load(prefix)
+    return PersonaTable.from_dicts(load_seed_personas())
+
+
+def _distribution(values: List[Any]) -> Tuple[List[Any], np.ndarray]:
+    labels, counts = np.unique(np.asarray(values, dtype=object).astype(str), return_counts=True)
+    return labels.tolist(), counts / counts.sum()
+
+
+def marginals_from(personas: List[dict]) -> Dict[str, Any]:
+    """Marginal (and a few conditional) distributions estimated from personas"""
+    def band(age: int) -> int:
+        for i, (low, high) in enumerate(GA4_AGE_BANDS):
+            if age <= high:
+                return i
+        return len(GA4_AGE_BANDS) - 1
+
+    marginals: Dict[str, Any] = {
+        "age_band": _distribution([band(p["age"]) for p in personas]),
+    }
+    for field in ["gender", "city", "income", "state_primary", "state_secondary",
+                  "lifestyle", "cbd_experience"]:
+        marginals[field] = _distribution([p[field] for p in personas])
+    # Price sensitivity follows income
+    marginals["price_sensitivity|income"] = {
+        income: _distribution([p["price_sensitivity"] for p in personas if p["income"] == income])
+        for income in marginals["income"][0]
+    }
+    return marginals
+
+
+def generate_population(size: int, seed: int = 0, personas: Optional[List[dict]] = None,
+                        marginals: Optional[Dict[str, Any]] = None) -> PersonaTable:
+    """Draw `size` personas from the marginals of `personas` (seed personas by default).
+
+    Attributes are independent except price_sensitivity (conditioned on
+    income) and state_secondary (never equal to state_primary). Name,
+    occupation and personality text is borrowed from a seed persona with
+    the same gender / lifestyle so prompts stay realistic.
+    """
+    personas = personas or load_seed_personas()
+    marginals = marginals or marginals_from(personas)
+    rng = np.random.default_rng(seed)
+
+    def draw(field: str, n: int = size) -> np.ndarray:
+        labels, p = marginals[field]
+        return np.asarray(labels, dtype=object)[rng.choice(len(labels), size=n, p=p)]
+
+    columns: Dict[str, np.ndarray] = {}
+    band_labels, band_p = marginals["age_band"]
+    bands = np.asarray(band_labels, dtype=int)[rng.choice(len(band_labels), size=size, p=band_p)]
+    low = np.array([GA4_AGE_BANDS[b][0] for b in range(len(GA4_AGE_BANDS))])[bands]
+    high = np.array([GA4_AGE_BANDS[b][1] for b in range(len(GA4_AGE_BANDS))])[bands]
+    ages = rng.integers(low, high + 1)
+
+    for field in ["gender", "city", "income", "state_primary", "lifestyle", "cbd_experience"]:
+        columns[field] = draw(field)
+
+    columns["price_sensitivity"] = np.empty(size, dtype=object)
+    for income, (labels, p) in marginals["price_sensitivity|income"].items():
+        mask = columns["income"] == income
+        columns["price_sensitivity"][mask] = np.asarray(labels, dtype=object)[
+            rng.choice(len(labels), size=int(mask.sum()), p=p)]
+
+    secondary = draw("state_secondary")
+    clash = secondary == columns["state_primary"]
+    while clash.any():
+        secondary[clash] = draw("state_secondary", int(clash.sum()))
+        clash = secondary == columns["state_primary"]
+    columns["state_secondary"] = secondary
+
+    by_gender = {g: [p for p in personas if p["gender"] == g] for g in set(p["gender"] for p in personas)}
+    first_names = {g: np.array([p["name"].split()[0] for p in ps], dtype=object) for g, ps in by_gender.items()}
+    last_names = {g: np.array([p["name"].split()[-1] for p in ps], dtype=object) for g, ps in by_gender.items()}
+    columns["name"] = np.empty(size, dtype=object)
+    for g in by_gender:
+        mask = columns["gender"] == g
+        n = int(mask.sum())
+        columns["name"][mask] = (first_names[g][rng.integers(0, len(first_names[g]), n)] + " "
+                                 + last_names[g][rng.integers(0, len(last_names[g]), n)])
+
+    columns["occupation"] = np.empty(size, dtype=object)
+    columns["personality"] = np.empty(size, dtype=object)
+    for lifestyle in set(p["lifestyle"] for p in personas):
+        templates = [p for p in personas if p["lifestyle"] == lifestyle]
+        mask = columns["lifestyle"] == lifestyle
+        picks = rng.integers(0, len(templates), int(mask.sum()))
+        columns["occupation"][mask] = np.array([t["occupation"] for t in templates], dtype=object)[picks]
+        columns["personality"][mask] = np.array([t["personality"] for t in templates], dtype=object)[picks]
+
+    data = np.zeros(size, dtype=DTYPE)
+    data["id"] = np.arange(1, size + 1)
+    data["age"] = ages
+    vocab = {}
+    for field in CATEGORICAL_FIELDS:
+        labels, codes = np.unique(columns[field].astype(str), return_inverse=True)
+        vocab[field] = labels.tolist()
+        data[field] = codes
+    return PersonaTable(data, vocab)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic persona population")
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join("data", "population"),
+                        help="output path prefix (.npy and .vocab.json are appended)")
+    args = parser.parse_args()
+
+    table = generate_population(args.size, seed=args.seed)
+    table.save(args.out)
+    print(f"Saved {len(table)} personas to {args.out}.npy ({table.data.nbytes / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Prompt construction for persona queries, laid out for Anthropic prompt caching
+
+System blocks go from most to least shared so each cache_control
+breakpoint covers a reusable prefix:
+
+    [instructions + rubric]  same for every persona and every test
+    [persona profile]        same for this persona across tests
+    user: the question       changes per test
+
+Prefixes shorter than the model's minimum cacheable length (1024 tokens
+for Sonnet/Opus, 2048 for Haiku) are simply not cached by the API; the
+breakpoints are harmless then. A single-persona prefix (instructions plus
+one profile) is about 300 tokens, so only batched calls (batch_size > 1)
+get cache reads.
+"""
+import os
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple
+
+# Part of the response cache key: bump when prompt wording changes
+PROMPT_VERSION = "2"
+PROMPT_CACHE = os.environ.get("PROMPT_CACHE", "1") != "0"
+# Persona blocks kept for reuse (LRU); built on first use
+PROMPT_PERSONA_BLOCKS = int(os.environ.get("PROMPT_PERSONA_BLOCKS", "10000"))
+
+SINGLE_CALL_CACHE_NOTE = ("Single-persona prompts are shorter than the minimum cacheable prefix, "
+                          "so cache_read_input_tokens stays 0; batch_size > 1 enables prompt-cache reads")
+
+SCALE_RUBRIC = """Оціни за шкалою від 1 до 10:
+1 = категорично не згоден / зовсім не цікаво
+10 = повністю згоден / дуже цікаво"""
+
+CHOICE_RUBRIC = "Обери один з варіантів, наведених у питанні."
+
+ANSWER_FORMATS = {
+    "scale": '{"score": число, "reasoning": "1 речення чому"}',
+    "choice": '{"choice": номер, "reasoning": "1 речення чому"}',
+}
+
+BATCH_ANSWER_FORMATS = {
+    "scale": '[{"persona_id": id, "score": число, "reasoning": "1 речення чому"}, ...]',
+    "choice": '[{"persona_id": id, "choice": номер, "reasoning": "1 речення чому"}, ...]',
+}
+
+
+def persona_profile(persona: dict) -> str:
+    return f"""{persona['name']}, {persona['age']} років, {persona['gender']}, живеш у місті {persona['city']}.
+
+Твій профіль:
+- Професія: {persona['occupation']}
+- Дохід: {persona['income']} грн/міс
+- Головна проблема зі здоров'ям: {persona['state_primary']}
+- Досвід з CBD: {persona['cbd_experience']}
+- Чутливість до ціни: {persona['price_sensitivity']}
+- Характер: {persona['personality']}"""
+
+
+def question_prompt(hypothesis: str, question_type: str, options: Optional[List[str]] = None) -> str:
+    if question_type == "scale":
+        return f"Питання: {hypothesis}"
+    return f"""Питання: {hypothesis}
+
+Варіанти:
+{chr(10).join([f"{i+1}. {opt}" for i, opt in enumerate(options or [])])}"""
+
+
+def _kind(question_type: str) -> str:
+    return "scale" if question_type == "scale" else "choice"
+
+
+class PromptBuilder:
+    """Builds Messages API system blocks and user text.
+
+    Instruction blocks are built once; per-persona profile blocks are built
+    on first use and the most recently used `max_personas` are reused (same
+    dict objects) for later calls.
+    """
+
+    def __init__(self, cache_prefix: bool = PROMPT_CACHE, max_personas: int = PROMPT_PERSONA_BLOCKS):
+        self.cache_prefix = cache_prefix
+        self.max_personas = max_personas
+        self._instructions: Dict[Tuple[str, bool], Dict[str, Any]] = {}
+        self._personas: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+
+    def _block(self, text: str, cache: bool = True) -> Dict[str, Any]:
+        block: Dict[str, Any] = {"type": "text", "text": text}
+        if cache and self.cache_prefix:
+            block["cache_control"] = {"type": "ephemeral"}
+        return block
+
+    def instructions(self, question_type: str, batch: bool = False) -> Dict[str, Any]:
+        key = (_kind(question_type), batch)
+        block = self._instructions.get(key)
+        if block is None:
+            kind = key[0]
+            rubric = SCALE_RUBRIC if kind == "scale" else CHOICE_RUBRIC
+            if batch:
+                text = f"""Ти відповідаєш від імені кожної з людей, профілі яких наведено нижче, окремо.
+Кожна людина відповідає ТІЛЬКИ від свого імені, незалежно від інших. Будь чесним. Українською мовою.
+
+{rubric}
+
+Відповідь ТІЛЬКИ у форматі JSON-масиву, один елемент на кожного persona_id: {BATCH_ANSWER_FORMATS[kind]}"""
+            else:
+                text = f"""Ти відповідаєш на питання від імені людини, профіль якої наведено нижче.
+Відповідай ТІЛЬКИ від імені цієї людини. Будь чесним. Українською мовою.
+
+{rubric}
+
+Відповідь ТІЛЬКИ у форматі JSON: {ANSWER_FORMATS[kind]}"""
+            block = self._instructions[key] = self._block(text)
+        return block
+
+    def persona_block(self, persona: dict) -> Dict[str, Any]:
+        key = persona["id"]
+        block = self._personas.get(key)
+        if block is not None:
+            self._personas.move_to_end(key)
+            return block
+        block = self._personas[key] = self._block(f"Ти — {persona_profile(persona)}")
+        while len(self._personas) > self.max_personas:
+            self._personas.popitem(last=False)
+        return block
+
+    def single(self, persona: dict, hypothesis: str, question_type: str,
+               options: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], str]:
+        system = [self.instructions(question_type), self.persona_block(persona)]
+        return system, question_prompt(hypothesis, question_type, options)
+
+    def batch(self, personas: List[dict], hypothesis: str, question_type: str,
+              options: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], str]:
+        profiles = "\n\n".join(f"[persona_id={p['id']}] {persona_profile(p)}" for p in personas)
+        system = [self.instructions(question_type, batch=True), self._block(profiles)]
+        return system, question_prompt(hypothesis, question_type, options)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"cache_prefix": self.cache_prefix, "persona_blocks": len(self._personas),
+                "max_persona_blocks": self.max_personas, "version": PROMPT_VERSION}
+
+
+prompt_builder = PromptBuilder()
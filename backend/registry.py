@@ -0,0 +1,162 @@
+"""
+Persona registry with bitset indexes for segment filtering
+"""
+import json
+from typing import Optional, List, Dict, Any, Iterable, Sequence
+
+import numpy as np
+
+from conditional import make_etag
+
+AGE_BANDS = [(18, 24), (25, 34), (35, 44), (45, 54), (55, 200)]
+
+# Request segment key -> indexed attribute
+SEGMENT_KEYS = {
+    "state": "state_primary",
+    "state_primary": "state_primary",
+    "lifestyle": "lifestyle",
+    "city": "city",
+    "gender": "gender",
+    "age": "age_band",
+    "age_band": "age_band",
+    "cbd_experience": "cbd_experience",
+}
+
+INDEXED_ATTRIBUTES = ["state_primary", "lifestyle", "city", "gender", "age_band", "cbd_experience"]
+
+STATE_LABELS = {
+    "stress": "Стрес", "sleep": "Сон", "energy": "Енергія",
+    "focus": "Фокус", "immunity": "Імунітет", "recovery": "Відновлення"
+}
+
+LIFESTYLE_LABELS = {
+    "high_achiever": "High Achievers", "creative_professional": "Креативні",
+    "biohacker": "Біохакери", "wellness_enthusiast": "Wellness",
+    "fitness_focused": "Фітнес", "holistic_believer": "Холістики",
+    "conscious_consumer": "Свідомі споживачі", "skeptic": "Скептики"
+}
+
+
+def age_band(age: int) -> str:
+    for low, high in AGE_BANDS:
+        if low <= age <= high:
+            return f"{low}+" if high >= 200 else f"{low}-{high}"
+    return "<18"
+
+
+class PersonaRegistry:
+    """Personas plus one inverted index per attribute.
+
+    Each index maps a value to a bitset (a Python int, bit i = personas[i]).
+    A segment query ORs the bitsets of the requested values within an
+    attribute and ANDs across attributes, so cost grows with the number of
+    filter values, not the population.
+    """
+
+    def __init__(self, personas: Sequence[dict]):
+        self.personas = personas
+        self.all = (1 << len(personas)) - 1
+        if hasattr(personas, "codes"):
+            self.indexes = self._index_columns(personas)
+        else:
+            self.indexes = self._index_rows(personas)
+        self.segments = self._build_segments()
+        self.etag = make_etag(json.dumps(self.segments, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+    def __len__(self) -> int:
+        return len(self.personas)
+
+    @staticmethod
+    def _index_rows(personas: Sequence[dict]) -> Dict[str, Dict[Any, int]]:
+        indexes: Dict[str, Dict[Any, int]] = {attr: {} for attr in INDEXED_ATTRIBUTES}
+        for i, p in enumerate(personas):
+            bit = 1 << i
+            for attr in INDEXED_ATTRIBUTES:
+                value = age_band(p["age"]) if attr == "age_band" else p[attr]
+                index = indexes[attr]
+                index[value] = index.get(value, 0) | bit
+        return indexes
+
+    @staticmethod
+    def _index_columns(table) -> Dict[str, Dict[Any, int]]:
+        """Build bitsets straight from a PersonaTable's code columns"""
+        def bitset(selected: np.ndarray) -> int:
+            return int.from_bytes(np.packbits(selected, bitorder="little").tobytes(), "little")
+
+        indexes: Dict[str, Dict[Any, int]] = {}
+        for attr in INDEXED_ATTRIBUTES:
+            if attr == "age_band":
+                labels = sorted({age_band(a) for a in range(0, 256)})
+                lookup = np.array([labels.index(age_band(a)) for a in range(0, 256)])
+                codes = lookup[np.asarray(table.column("age"))]
+            else:
+                codes, labels = table.codes(attr)
+                codes = np.asarray(codes)
+            indexes[attr] = {labels[c]: bitset(codes == c) for c in np.unique(codes)}
+        return indexes
+
+    def mask(self, segments: Optional[Dict[str, Any]]) -> int:
+        mask = self.all
+        for key, values in (segments or {}).items():
+            attr = SEGMENT_KEYS.get(key)
+            if attr is None or not values:
+                continue
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            index = self.indexes[attr]
+            selected = 0
+            for value in values:
+                # Malformed values (lists, objects) match nothing
+                try:
+                    selected |= index.get(value, 0)
+                except TypeError:
+                    continue
+            mask &= selected
+            if not mask:
+                break
+        return mask
+
+    def indices(self, mask: int) -> np.ndarray:
+        n = len(self.personas)
+        raw = np.frombuffer(mask.to_bytes((n + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little")[:n])
+
+    def rows(self, indices: Iterable[int]) -> List[dict]:
+        personas = self.personas
+        return [personas[int(i)] for i in indices]
+
+    def select(self, mask: int) -> List[dict]:
+        return self.rows(self.indices(mask))
+
+    def filter_indices(self, segments: Optional[Dict[str, Any]]) -> np.ndarray:
+        """Positions of the personas in the segments, without building any persona dicts"""
+        if not segments:
+            return np.arange(len(self.personas))
+        return self.indices(self.mask(segments))
+
+    def filter(self, segments: Optional[Dict[str, Any]]) -> List[dict]:
+        return self.rows(self.filter_indices(segments))
+
+    def count(self, segments: Optional[Dict[str, Any]]) -> int:
+        return bin(self.mask(segments)).count("1")
+
+    def values(self, attr: str) -> Iterable[Any]:
+        return sorted(self.indexes[attr])
+
+    def _build_segments(self) -> Dict[str, Any]:
+        counts = {
+            attr: {str(v): bin(bits).count("1") for v, bits in sorted(index.items())}
+            for attr, index in self.indexes.items()
+        }
+        return {
+            "states": list(self.values("state_primary")),
+            "lifestyles": list(self.values("lifestyle")),
+            "cities": list(self.values("city")),
+            "genders": list(self.values("gender")),
+            "age_bands": list(self.values("age_band")),
+            "cbd_experience": list(self.values("cbd_experience")),
+            "counts": counts,
+            "total": len(self.personas),
+            "state_labels": STATE_LABELS,
+            "lifestyle_labels": LIFESTYLE_LABELS,
+        }
@@ -0,0 +1,228 @@
+"""
+Vectorized rule-based simulation for large Monte Carlo runs
+"""
+from typing import Optional, List, Dict, Any, Sequence, Tuple, Union
+
+import numpy as np
+
+from population import PersonaTable
+
+# Keyword stems that switch on each rule in simulate_response
+HYPOTHESIS_KEYWORDS = {
+    "price": ("знижк", "акці", "ціна"),
+    "subscription": ("підписк",),
+    "store": ("experience", "магазин", "офлайн"),
+    "new_product": ("новий", "продукт"),
+    "sleep": ("сон", "sleep"),
+    "stress": ("стрес", "stress"),
+    "focus": ("фокус", "концентрац"),
+}
+
+OPTION_KEYWORDS = {
+    "premium": ("дорог", "премі"),
+    "budget": ("дешев", "економ", "бюджет"),
+    "subscription": ("підписк",),
+}
+
+MAX_SAMPLES = 1_000_000
+SAMPLE_RESPONSES = 10
+Z_95 = 1.96
+
+
+def _match(text: str, table: Dict[str, Sequence[str]]) -> Dict[str, bool]:
+    text = text.lower()
+    return {name: any(stem in text for stem in stems) for name, stems in table.items()}
+
+
+def parse_hypothesis(hypothesis: str) -> Dict[str, bool]:
+    return _match(hypothesis, HYPOTHESIS_KEYWORDS)
+
+
+def parse_option(option: str) -> Dict[str, bool]:
+    return _match(option, OPTION_KEYWORDS)
+
+
+class PersonaColumns:
+    """Column arrays over the selected rows of a PersonaTable, with the rule predicates precomputed.
+
+    Built from the table's integer codes, so no persona dicts are created;
+    state_primary and lifestyle stay as codes into state_labels / lifestyle_labels.
+    """
+
+    def __init__(self, table: Union[PersonaTable, List[dict]], indices: Optional[np.ndarray] = None):
+        if not hasattr(table, "codes"):
+            table = PersonaTable.from_dicts(table)
+        self.table = table
+        self.indices = np.arange(len(table)) if indices is None else np.asarray(indices, dtype=np.int64)
+        self.id = np.asarray(table.column("id"))[self.indices].astype(np.int64)
+        self.age = np.asarray(table.column("age"))[self.indices].astype(np.int16)
+        self.state_primary, self.state_labels = self._codes("state_primary")
+        self.lifestyle, self.lifestyle_labels = self._codes("lifestyle")
+
+        self.price_high = self._isin("price_sensitivity", ["very_high", "high"])
+        self.price_low = self._isin("price_sensitivity", ["low", "very_low"])
+        self.experienced = self._isin("cbd_experience", ["experienced"])
+        self.beginner = self._isin("cbd_experience", ["beginner", "none"])
+        self.young = self.age < 35
+        self.older = self.age >= 50
+        self.kyiv = self._isin("city", ["Київ"])
+
+    def _codes(self, field: str) -> Tuple[np.ndarray, List[str]]:
+        codes, labels = self.table.codes(field)
+        return np.asarray(codes)[self.indices], list(labels)
+
+    def _isin(self, field: str, values: Sequence[str]) -> np.ndarray:
+        codes, labels = self._codes(field)
+        return np.isin(codes, [labels.index(v) for v in values if v in labels])
+
+    def state_is(self, state: str) -> np.ndarray:
+        if state not in self.state_labels:
+            return np.zeros(len(self), dtype=bool)
+        return self.state_primary == self.state_labels.index(state)
+
+    def persona(self, k: int) -> dict:
+        """Row k of the selection as a persona dict"""
+        return self.table[int(self.indices[k])]
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+
+def base_scores(columns: PersonaColumns, features: Dict[str, bool]) -> np.ndarray:
+    """Deterministic part of the scale score per persona (before noise)"""
+    c = columns
+    base = np.full(len(c), 5.5)
+    if features["price"]:
+        base += 2.5 * c.price_high - 0.5 * c.price_low
+    if features["subscription"]:
+        base += 1.5 * c.experienced - 1.5 * c.beginner + 1.0 * c.young - 1.0 * c.older
+    if features["store"]:
+        base += np.where(c.kyiv, 2.0, -1.5)
+    if features["new_product"]:
+        base += 0.5 * c.experienced + 1.5 * c.beginner
+    if features["sleep"]:
+        base += 2.0 * c.state_is("sleep")
+    if features["stress"]:
+        base += 2.0 * c.state_is("stress")
+    if features["focus"]:
+        base += 2.0 * c.state_is("focus")
+    return base
+
+
+def choice_weights(columns: PersonaColumns, options: List[str]) -> np.ndarray:
+    """(personas x options) weight matrix, same rules as simulate_response"""
+    c = columns
+    weights = np.ones((len(c), len(options)))
+    for j, opt in enumerate(options):
+        f = parse_option(opt)
+        if f["premium"]:
+            weights[:, j] += 2.0 * c.price_low
+        if f["budget"]:
+            weights[:, j] += 2.0 * c.price_high
+        if f["subscription"]:
+            weights[:, j] += 1.5 * c.experienced
+    return weights
+
+
+def _ci(mean: np.ndarray, var: np.ndarray, n: np.ndarray) -> np.ndarray:
+    half = Z_95 * np.sqrt(np.divide(var, n, out=np.zeros_like(var), where=n > 0))
+    return np.stack([mean - half, mean + half], axis=-1)
+
+
+def _group_means(codes: np.ndarray, labels: Sequence[str], scores: np.ndarray, key: str) -> List[Dict[str, Any]]:
+    n = np.bincount(codes, minlength=len(labels)).astype(float)
+    s = np.bincount(codes, weights=scores, minlength=len(labels))
+    ss = np.bincount(codes, weights=scores * scores, minlength=len(labels))
+    mean = np.divide(s, n, out=np.zeros_like(s), where=n > 0)
+    var = np.divide(ss, n, out=np.zeros_like(ss), where=n > 0) - mean ** 2
+    ci = _ci(mean, np.maximum(var, 0.0), n)
+    return [
+        {key: str(labels[i]), "avg": round(float(mean[i]), 2), "count": int(n[i]),
+         "ci95": [round(float(ci[i, 0]), 2), round(float(ci[i, 1]), 2)]}
+        for i in range(len(labels)) if n[i] > 0
+    ]
+
+
+def simulate_bulk(personas: Union[PersonaTable, List[dict]], hypothesis: str, question_type: str,
+                  options: Optional[List[str]] = None, samples: int = 10000,
+                  seed: Optional[int] = None, indices: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """Draw `samples` respondents uniformly from personas[indices] (all by default) and aggregate in batch.
+
+    Per-respondent outcomes follow the same rules and noise as
+    simulate_response; only the RNG differs (seeded numpy Generator).
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+    rng = np.random.default_rng(seed)
+    columns = PersonaColumns(personas, indices)
+    idx = rng.integers(0, len(columns), size=samples)
+    u = rng.random(samples)
+
+    meta = {"samples": samples, "seed": seed, "personas": len(columns)}
+
+    if question_type == "scale":
+        base = base_scores(columns, parse_hypothesis(hypothesis))
+        scores = np.clip(np.round(base[idx] + (u - 0.5) * 2.5), 1, 10)
+        ints = scores.astype(np.int64)
+
+        mean = float(scores.mean())
+        var = float(scores.var())
+        half = Z_95 * (var / samples) ** 0.5
+        distribution = np.bincount(ints - 1, minlength=10)
+
+
+        return {
+            "type": "scale",
+            "total": samples,
+            "average": round(mean, 1),
+            "average_ci95": [round(mean - half, 2), round(mean + half, 2)],
+            "std": round(var ** 0.5, 2),
+            "distribution": [{"score": i + 1, "count": int(c), "pct": round(int(c) / samples * 100, 1)}
+                             for i, c in enumerate(distribution)],
+            "positive": int((ints >= 7).sum()),
+            "neutral": int(((ints >= 4) & (ints < 7)).sum()),
+            "negative": int((ints < 4).sum()),
+            "by_state": _group_means(columns.state_primary[idx], columns.state_labels, scores, "state"),
+            "by_lifestyle": _group_means(columns.lifestyle[idx], columns.lifestyle_labels, scores, "lifestyle"),
+            "responses": [
+                {"score": int(ints[k]), "reasoning": "Симульована відповідь на основі профілю",
+                 "persona_id": int(columns.id[idx[k]]), "persona_name": columns.persona(idx[k])["name"],
+                 "source": "simulated"}
+                for k in range(min(SAMPLE_RESPONSES, samples))
+            ],
+            "sources": {"simulated": samples},
+            **meta,
+        }
+
+    options = options or []
+    if not options:
+        choices = np.zeros(samples, dtype=np.int64)
+        labels: List[Any] = [1]
+    else:
+        weights = choice_weights(columns, options)
+        cumulative = weights.cumsum(axis=1)
+        r = u * cumulative[idx, -1]
+        choices = np.minimum((r[:, None] > cumulative[idx]).sum(axis=1), len(options) - 1)
+        labels = options
+
+    counts = np.bincount(choices, minlength=len(labels))
+    p = (counts / samples).tolist()
+    half = (Z_95 * np.sqrt(counts / samples * (1 - counts / samples) / samples)).tolist()
+    return {
+        "type": "choice",
+        "total": samples,
+        "choices": [
+            {"choice": labels[i], "count": int(counts[i]), "pct": round(p[i] * 100, 1),
+             "ci95": [round(max(0.0, p[i] - half[i]) * 100, 1), round(min(1.0, p[i] + half[i]) * 100, 1)]}
+            for i in range(len(labels)) if counts[i] > 0
+        ],
+        "responses": [
+            {"choice": int(choices[k]) + 1, "choice_text": labels[choices[k]] if options else None,
+             "reasoning": "Симульована відповідь",
+             "persona_id": int(columns.id[idx[k]]), "persona_name": columns.persona(idx[k])["name"],
+             "source": "simulated"}
+            for k in range(min(SAMPLE_RESPONSES, samples))
+        ],
+        "sources": {"simulated": samples},
+        **meta,
+    }
@@ -0,0 +1,184 @@
+"""
+In-memory manifest of the frontend build with precompressed variants
+
+The build directory is indexed once at startup: every file is read, hashed
+for an ETag and compressed (gzip, plus brotli when the `brotli` package is
+installed; .gz/.br files already present in the build are used as-is).
+Requests are answered from the manifest, so serving a page costs no disk
+stat or read, and paths that are not in the manifest can never reach the
+filesystem.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from typing import Optional, Dict, Any, Tuple
+
+from conditional import make_etag
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Larger files are streamed from disk instead of kept in memory
+STATIC_INLINE_MAX = int(os.environ.get("STATIC_INLINE_MAX", str(4 * 1024 * 1024)))
+
+MIN_COMPRESS_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml",
+                      "image/svg+xml", "application/manifest+json")
+# Content-hashed build assets, e.g. static/js/main.3f2a9c1b.js, 787.1a2b3c4d.chunk.js
+HASHED_ASSET = re.compile(r"(^|/)static/.+\.[0-9a-f]{8,}\.(chunk\.)?[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Preference order when the client accepts several with the same q
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def normalize_path(path: str) -> str:
+    """URL path -> manifest key: no leading slash, no '.', '..' or empty segments"""
+    return posixpath.normpath("/" + path.replace("\\", "/")).lstrip("/")
+
+
+def accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}"""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def _compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class StaticFile:
+    """One servable path: identity bytes (or a disk path when large) plus encoded variants"""
+
+    __slots__ = ("key", "path", "body", "size", "content_type", "cache_control", "etag", "variants")
+
+    def __init__(self, key: str, path: str, body: Optional[bytes], size: int, content_type: str,
+                 cache_control: str, etag: str):
+        self.key = key
+        self.path = path
+        self.body = body
+        self.size = size
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = etag
+        # encoding -> (bytes, etag)
+        self.variants: Dict[str, Tuple[bytes, str]] = {}
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Tuple[Optional[str], Optional[bytes], str]:
+        """(content-encoding or None, body, etag) for the best variant the client accepts"""
+        if self.variants:
+            accepted = accepted_encodings(accept_encoding)
+            wildcard = accepted.get("*", 0.0)
+            best, best_q = None, 0.0
+            for encoding, _ in ENCODINGS:
+                if encoding in self.variants:
+                    q = accepted.get(encoding, wildcard)
+                    if q > best_q:
+                        best, best_q = encoding, q
+            if best is not None:
+                body, etag = self.variants[best]
+                return best, body, etag
+        return None, self.body, self.etag
+
+
+class StaticManifest:
+    def __init__(self, root: str, index: str = "index.html"):
+        self.root = os.path.abspath(root)
+        self.index_key = index
+        self.files: Dict[str, StaticFile] = {}
+        self.build()
+
+    def build(self):
+        files: Dict[str, StaticFile] = {}
+        paths = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                full = os.path.join(directory, name)
+                paths[os.path.relpath(full, self.root).replace(os.sep, "/")] = full
+
+        for key, full in sorted(paths.items()):
+            if key.endswith((".gz", ".br")) and key[:-3] in paths:
+                continue
+            files[key] = self._index_file(key, full, paths)
+        self.files = files
+
+    def _index_file(self, key: str, full: str, paths: Dict[str, str]) -> StaticFile:
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        cache_control = IMMUTABLE if HASHED_ASSET.search(key) else REVALIDATE
+        size = os.path.getsize(full)
+
+        if size > STATIC_INLINE_MAX:
+            with open(full, "rb") as f:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            etag = '"' + digest.hexdigest()[:32] + '"'
+            return StaticFile(key, full, None, size, content_type, cache_control, etag)
+
+        with open(full, "rb") as f:
+            body = f.read()
+        entry = StaticFile(key, full, body, size, content_type, cache_control, make_etag(body))
+
+        for encoding, ext in ENCODINGS:
+            prebuilt = paths.get(key + ext)
+            if prebuilt is not None:
+                with open(prebuilt, "rb") as f:
+                    encoded = f.read()
+            elif size >= MIN_COMPRESS_SIZE and _compressible(content_type):
+                if encoding == "gzip":
+                    encoded = gzip.compress(body, compresslevel=9, mtime=0)
+                elif BROTLI_AVAILABLE:
+                    encoded = brotli.compress(body, quality=11)
+                else:
+                    continue
+            else:
+                continue
+            if len(encoded) < size:
+                entry.variants[encoding] = (encoded, make_etag(body, "-" + ext[1:]))
+        return entry
+
+    def lookup(self, path: str) -> Optional[StaticFile]:
+        """File for a request path; unknown non-asset paths get index.html (client-side routes)"""
+        key = normalize_path(path)
+        entry = self.files.get(key or self.index_key)
+        if entry is not None:
+            return entry
+        if key.startswith(("static/", "api/")) or posixpath.splitext(key)[1]:
+            return None
+        return self.files.get(self.index_key)
+
+    def stats(self) -> Dict[str, Any]:
+        variants: Dict[str, int] = {}
+        for entry in self.files.values():
+            for encoding in entry.variants:
+                variants[encoding] = variants.get(encoding, 0) + 1
+        return {
+            "files": len(self.files),
+            "bytes": sum(e.size for e in self.files.values()),
+            "inline_bytes": sum(len(e.body) for e in self.files.values() if e.body is not None),
+            "compressed_bytes": sum(len(b) for e in self.files.values() for b, _ in e.variants.values()),
+            "variants": variants,
+            "brotli": BROTLI_AVAILABLE,
+        }
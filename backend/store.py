@@ -0,0 +1,161 @@
+"""
+Persistent storage for test results
+"""
+import abc
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+# sqlite:///relative.db, sqlite:////absolute.db or sqlite:///:memory:
+RESULT_STORE_URL = os.environ.get(
+    "RESULT_STORE_URL",
+    "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.db"),
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: str, test_id: str) -> str:
+    raw = f"{created_at}|{test_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, test_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, test_id
+
+
+class ResultStore(abc.ABC):
+    """Storage interface; records are the dicts returned by /api/test.
+
+    list() returns summaries (no per-persona responses), newest first, with
+    an opaque cursor for the next page. get() returns the full record.
+    """
+
+    @abc.abstractmethod
+    def add(self, record: Dict[str, Any], responses: List[dict], request: Optional[dict] = None):
+        ...
+
+    @abc.abstractmethod
+    def get(self, test_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def list(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+             q: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        ...
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        ...
+
+    def close(self):
+        pass
+
+
+class SQLiteResultStore(ResultStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS test_results (
+                id TEXT PRIMARY KEY,
+                hypothesis TEXT NOT NULL,
+                question_type TEXT,
+                created_at TEXT NOT NULL,
+                request TEXT,
+                results TEXT NOT NULL,
+                responses TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_test_results_created ON test_results (created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_test_results_hypothesis ON test_results (hypothesis);
+        """)
+
+    def add(self, record: Dict[str, Any], responses: List[dict], request: Optional[dict] = None):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO test_results (id, hypothesis, question_type, created_at, request, results, responses) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record["id"],
+                    record["hypothesis"],
+                    record["results"].get("type"),
+                    record["created_at"],
+                    json.dumps(request, ensure_ascii=False) if request is not None else None,
+                    json.dumps(record["results"], ensure_ascii=False),
+                    json.dumps(responses, ensure_ascii=False),
+                ),
+            )
+
+    def get(self, test_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM test_results WHERE id = ?", (test_id,)).fetchone()
+        if row is None:
+            return None
+        record = self._summary(row)
+        record["request"] = json.loads(row["request"]) if row["request"] else None
+        record["responses"] = json.loads(row["responses"])
+        return record
+
+    def list(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+             q: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where, params = [], []
+        if cursor:
+            created_at, test_id = decode_cursor(cursor)
+            where.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params += [created_at, created_at, test_id]
+        if q:
+            where.append("hypothesis LIKE ? ESCAPE '\\'")
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+
+        sql = "SELECT id, hypothesis, created_at, results FROM test_results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+
+        records = [self._summary(r) for r in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = records[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return records, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM test_results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "hypothesis": row["hypothesis"],
+            "created_at": row["created_at"],
+            "results": json.loads(row["results"]),
+        }
+
+
+def create_store(url: str = RESULT_STORE_URL) -> ResultStore:
+    if url.startswith("sqlite:///"):
+        return SQLiteResultStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported RESULT_STORE_URL: {url}")
@@ -0,0 +1,57 @@
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Tests never talk to the real API or write next to the code
+os.environ.pop("ANTHROPIC_API_KEY", None)
+os.environ.pop("ANTHROPIC_BASE_URL", None)
+os.environ.pop("PERSONA_POPULATION", None)
+os.environ["RESULT_STORE_URL"] = "sqlite:///:memory:"
+os.environ["RESPONSE_CACHE_PATH"] = ""
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+# Imported after the environment above is set: these modules read it at import time
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+from benchmark.mock_anthropic import MockAnthropic  # noqa: E402
+from llm import LLMClient  # noqa: E402
+
+
+@pytest.fixture
+def make_client():
+    """Factory for an LLMClient that talks to a MockAnthropic app in-process (no retries by default)"""
+    def make(mock: MockAnthropic, **kwargs) -> LLMClient:
+        kwargs.setdefault("max_retries", 0)
+        client = LLMClient(base_url="http://mock", api_key="test", **kwargs)
+        client._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.create_app()),
+                                           base_url="http://mock")
+        return client
+    return make
+
+
+@pytest.fixture
+def mock_claude(monkeypatch, make_client):
+    """Point main's Claude calls at a mock upstream; returns the client main now uses"""
+    def wire(mock: MockAnthropic, **kwargs) -> LLMClient:
+        import main
+
+        kwargs.setdefault("hedge", False)
+        client = make_client(mock, **kwargs)
+        monkeypatch.setattr(main, "ANTHROPIC_API_KEY", "test")
+        monkeypatch.setattr(main, "llm_client", client)
+        return client
+    return wire
+
+
+@pytest.fixture
+def app_client():
+    """Factory for an httpx client calling the API app in-process (create it inside the test's loop)"""
+    def make() -> httpx.AsyncClient:
+        import main
+
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://app")
+    return make
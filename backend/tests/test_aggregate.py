@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from aggregate import PairedChoiceComparison, mcnemar_p
+
+
+@pytest.mark.parametrize("to_variant,to_baseline,p", [
+    (0, 0, 1.0),
+    (5, 0, 0.0625),                 # exact: 2 * 0.5 ** 5
+    (10, 2, 0.0386),                # exact binomial
+    (30, 10, 0.0027),               # chi-square, continuity corrected: (|30 - 10| - 1)^2 / 40
+    (20, 20, 0.8744),
+])
+def test_mcnemar_p(to_variant, to_baseline, p):
+    assert mcnemar_p(to_variant, to_baseline) == pytest.approx(p, abs=1e-4)
+    assert mcnemar_p(to_baseline, to_variant) == pytest.approx(p, abs=1e-4)
+
+
+def test_paired_choices_use_only_discordant_pairs_per_segment():
+    comparison = PairedChoiceComparison(crosstab=["city"])
+    sleep = {"state_primary": "sleep", "lifestyle": "skeptic", "city": "Київ"}
+    stress = {"state_primary": "stress", "lifestyle": "skeptic", "city": "Львів"}
+    # Sleep personas all switch A -> B; stress personas never switch
+    for _ in range(10):
+        comparison.add("A", "B", sleep)
+        comparison.add("A", "A", stress)
+
+    result = comparison.result()
+    overall = {row["choice"]: row for row in result["choices"]}
+    assert result["pairs"] == 20
+    assert overall["B"]["switched_to"] == 10 and overall["B"]["switched_from"] == 0
+    assert overall["B"]["diff_pct"] == 50.0
+    assert overall["A"]["diff_pct"] == -50.0
+    assert overall["B"]["p_value"] == pytest.approx(2 * 0.5 ** 10, abs=1e-4)
+
+    by_state = {row["state"]: {c["choice"]: c for c in row["choices"]} for row in result["by_state"]}
+    assert by_state["sleep"]["B"]["significant"]
+    assert by_state["stress"]["B"]["p_value"] == 1.0
+    assert [row["value"] for row in result["crosstabs"]["city"]] == ["Київ", "Львів"]
+
+
+def test_choice_variants_are_paired_by_option_position():
+    import main
+
+    personas = [main.PERSONAS[i] for i in range(20)]
+    batch = main.BatchTestRequest(question_type="choice", variants=[
+        {"hypothesis": "a", "options": ["x", "y"]},
+        {"hypothesis": "b", "options": ["p", "q"]},
+    ])
+    (_, base_request), (_, request) = batch.variant_requests()
+    # Every persona picks the same position in both variants
+    answers = [{"choice": 1 + i % 2, "choice_text": ["x", "y"][i % 2]} for i in range(20)]
+    reworded = [{"choice": a["choice"], "choice_text": ["p", "q"][a["choice"] - 1]} for a in answers]
+
+    result = main.compare_variants(("A", base_request, answers), ("B", request, reworded), personas, None)
+
+    assert [row["choice"] for row in result["choices"]] == ["x", "y"]
+    for row in result["choices"]:
+        assert (row["diff_pct"], row["switched_to"], row["switched_from"]) == (0.0, 0, 0)
+        assert not row["significant"]
+    assert result["options"] == [{"position": 1, "baseline": "x", "variant": "p"},
+                                 {"position": 2, "baseline": "y", "variant": "q"}]
+
+
+def test_choice_batch_rejects_option_lists_of_different_lengths(app_client):
+    async def run():
+        async with app_client() as client:
+            return await client.post("/api/test/batch", json={"question_type": "choice", "variants": [
+                {"hypothesis": "a", "options": ["x", "y"]},
+                {"hypothesis": "b", "options": ["p", "q", "r"]},
+            ]})
+
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert "option position" in response.json()["detail"]
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import cache
+from benchmark.mock_anthropic import MockAnthropic
+from cache import ResponseCache, cache_key
+
+PERSONA = {"id": 1, "name": "Олена", "age": 30, "city": "Київ"}
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    c = ResponseCache(max_size=10, ttl=60, path="")
+    c.set("a", {"score": 7})
+    c.set("b", {"score": 3}, ttl=5)
+
+    clock.now += 30
+    assert c.get("a") == {"score": 7}
+    assert c.get("b") is None
+
+    clock.now += 31
+    assert c.get("a") is None
+    assert c.stats()["size"] == 0
+    assert (c.hits, c.misses) == (1, 2)
+
+
+def test_lru_evicts_least_recently_used(clock):
+    c = ResponseCache(max_size=2, ttl=60, path="")
+    c.set("a", {"score": 1})
+    c.set("b", {"score": 2})
+    c.get("a")
+    c.set("c", {"score": 3})
+
+    assert c.get("b") is None
+    assert c.get("a") == {"score": 1}
+    assert c.get("c") == {"score": 3}
+
+
+def test_returned_values_are_copies(clock):
+    c = ResponseCache(max_size=10, ttl=60, path="")
+    c.set("a", {"score": 1})
+    c.get("a")["source"] = "cached"
+    assert c.get("a") == {"score": 1}
+
+
+def test_disk_tier_survives_restart_and_honours_ttl(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    c = ResponseCache(max_size=10, ttl=60, path=path)
+    c.set("a", {"score": 5})
+    c.close()
+
+    c = ResponseCache(max_size=10, ttl=60, path=path)
+    assert c.get("a") == {"score": 5}
+    assert c.disk_hits == 1
+
+    c = ResponseCache(max_size=10, ttl=60, path=path)
+    clock.now += 61
+    assert c.get("a") is None
+    assert c._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 0
+
+
+def test_key_covers_persona_profile_and_prompt_version():
+    key = cache_key(PERSONA, "h", "scale", None, "model", "2")
+    assert key == cache_key(dict(PERSONA), "h", "scale", [], "model", "2")
+    assert key != cache_key({**PERSONA, "city": "Львів"}, "h", "scale", None, "model", "2")
+    assert key != cache_key(PERSONA, "h", "scale", None, "model", "3")
+
+
+@pytest.fixture
+def claude(monkeypatch, mock_claude):
+    """main.query_claude wired to a mock upstream and an empty memory-only cache"""
+    import main
+
+    mock = MockAnthropic("fixed:0")
+    mock_claude(mock)
+    store = ResponseCache(max_size=100, ttl=60, path="")
+    monkeypatch.setattr(main, "response_cache", store)
+    persona = main.PERSONAS[0]
+
+    def ask(*modes: str):
+        async def run():
+            return [await main.query_claude(persona, "Гіпотеза", "scale", None, mode) for mode in modes]
+        return [r["source"] for r in asyncio.run(run())]
+
+    return ask, mock, store
+
+
+def test_use_reads_and_writes_cache(claude):
+    ask, mock, store = claude
+    assert ask("use", "use") == ["llm", "cached"]
+    assert mock.requests == 1
+
+
+def test_bypass_neither_reads_nor_writes(claude):
+    ask, mock, store = claude
+    assert ask("use", "bypass", "bypass") == ["llm", "llm", "llm"]
+    assert mock.requests == 3
+    assert store.stats()["size"] == 1
+
+    store.clear()
+    assert ask("bypass", "use") == ["llm", "llm"]
+
+
+def test_refresh_skips_read_but_stores_fresh_answer(claude):
+    ask, mock, store = claude
+    assert ask("use", "refresh", "use") == ["llm", "llm", "cached"]
+    assert mock.requests == 2
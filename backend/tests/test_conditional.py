@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from conditional import etag_matches, make_etag
+
+ETAG = make_etag(b"segments")
+
+
+@pytest.mark.parametrize("header,matches", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    ("W/" + ETAG, True),
+    (f'"other", {ETAG}', True),
+    (" * ", True),
+    ('"other"', False),
+    (ETAG.strip('"'), False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, ETAG) is matches
+
+
+def test_segments_revalidate_with_weak_and_listed_etags(app_client):
+    async def run():
+        async with app_client() as client:
+            first = await client.get("/api/segments")
+            etag = first.headers["etag"]
+            statuses = [(await client.get("/api/segments", headers={"If-None-Match": value})).status_code
+                        for value in (etag, "W/" + etag, f'"stale", {etag}', '"stale"')]
+            return first, statuses
+
+    first, statuses = asyncio.run(run())
+    assert first.status_code == 200
+    assert statuses == [304, 304, 304, 200]
@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from benchmark.mock_anthropic import MockAnthropic
+from jobs import JobManager, QueueFullError, DONE, FAILED, CANCELLED, QUEUED
+
+
+class Aggregate:
+    def __init__(self):
+        self.count = 0
+
+    def add(self, response: dict):
+        self.count += 1
+
+    def result(self) -> dict:
+        return {"total": self.count}
+
+
+async def wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_finished_job_keeps_only_counts_and_result_id():
+    async def runner(job):
+        job.aggregate = Aggregate()
+        for i in range(3):
+            job.add({"score": i})
+            job.aggregate.add({"score": i})
+        return {"id": "test_1", "results": {"total": 3}}
+
+    async def run():
+        manager = JobManager(runner, workers=1)
+        await manager.start()
+        job = manager.submit("request", total=3)
+        await wait_for(lambda: job.status == DONE)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.summary()["done"] == 3
+    assert job.result_id == "test_1"
+    assert job.responses == []
+    assert job.aggregate is None
+    assert job.result is None
+
+
+def test_cancel_running_job_stops_runner_and_keeps_partial():
+    stopped = []
+
+    async def runner(job):
+        job.aggregate = Aggregate()
+        job.add({"score": 1})
+        job.aggregate.add({"score": 1})
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            stopped.append(job.id)
+            raise
+        return {"id": "never"}
+
+    async def run():
+        manager = JobManager(runner, workers=1)
+        await manager.start()
+        job = manager.submit("request", total=2)
+        await wait_for(lambda: job.done == 1)
+        manager.cancel(job.id)
+        await asyncio.sleep(0.01)
+        worker_alive = not manager._workers[0].done()
+        await manager.stop()
+        return job, worker_alive
+
+    job, worker_alive = asyncio.run(run())
+    assert stopped == [job.id]
+    assert worker_alive
+    assert job.status == CANCELLED
+    assert job.partial == {"total": 1}
+    assert job.result_id is None
+    assert job.responses == []
+
+
+def test_cancelled_queued_job_is_never_run():
+    started = []
+
+    async def runner(job):
+        started.append(job.id)
+        await asyncio.sleep(0.05)
+        return {"id": job.id}
+
+    async def run():
+        manager = JobManager(runner, workers=1)
+        await manager.start()
+        first = manager.submit("request", total=1)
+        second = manager.submit("request", total=1)
+        assert second.status == QUEUED
+        manager.cancel(second.id)
+        await wait_for(lambda: first.status == DONE)
+        await asyncio.sleep(0.01)
+        await manager.stop()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert started == [first.id]
+    assert second.status == CANCELLED
+
+
+def test_full_queue_rejects_and_failures_are_reported():
+    async def runner(job):
+        raise RuntimeError("boom")
+
+    async def run():
+        manager = JobManager(runner, workers=1, queue_size=1)
+        await manager.start()
+        job = manager.submit("request", total=1)
+        with pytest.raises(QueueFullError):
+            manager.submit("request", total=1)
+        await wait_for(lambda: job.status == FAILED)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.error == "boom"
+
+
+def test_bulk_job_reports_full_progress():
+    import main
+
+    async def run():
+        manager = JobManager(main.run_job, workers=1)
+        await manager.start()
+        request = main.HypothesisRequest(hypothesis="Сон", question_type="scale", mode="simulate_bulk",
+                                         samples=1000, seed=1)
+        job = manager.submit(request, total=len(main.filter_personas(request)))
+        await wait_for(lambda: job.status == DONE)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job.result_id is not None
+    assert job.summary()["done"] == job.summary()["total"] == len(main.PERSONAS)
+
+
+def test_cancel_job_stops_outstanding_llm_calls(mock_claude):
+    import main
+
+    mock = MockAnthropic("fixed:30")
+    client = mock_claude(mock)
+
+    async def run():
+        manager = JobManager(main.run_job, workers=1)
+        await manager.start()
+        request = main.HypothesisRequest(hypothesis="Тест скасування", question_type="scale",
+                                         segments={"city": ["Київ"]}, cache="bypass")
+        job = manager.submit(request, total=len(main.filter_personas(request)))
+        await wait_for(lambda: mock.in_flight > 0)
+        manager.cancel(job.id)
+        await asyncio.sleep(0.05)
+        # Checked inside the loop: asyncio.run() would cancel leftovers itself
+        assert job.status == CANCELLED
+        assert client.in_flight == 0
+        assert mock.in_flight == 0
+        await manager.stop()
+        await client.close()
+
+    asyncio.run(run())
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmark.mock_anthropic import MockAnthropic, parse_latency
+from llm import LLMClient, CircuitBreaker, CircuitOpenError, LLM_BACKOFF_MAX, request_shape
+
+SINGLE = {"model": "m", "max_tokens": 150, "system": "s", "messages": [{"role": "user", "content": "q"}]}
+BATCH = {**SINGLE, "max_tokens": 150 * 25}
+
+
+def set_latency(mock: MockAnthropic, spec: str):
+    mock.latency_spec = spec
+    mock.sample_latency = parse_latency(spec)
+
+
+def arm_hedging(client: LLMClient, payload: dict, seconds: float):
+    tracker = client._tracker(request_shape(payload))
+    for _ in range(tracker.min_samples):
+        tracker.add(seconds)
+
+
+def test_retries_honour_retry_after(make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0", rate_limit_rate=1.0, retry_after=0.05)
+        client = make_client(mock, max_retries=2)
+        started = time.monotonic()
+        response = await client.post_messages(SINGLE)
+        return response, time.monotonic() - started, mock, client
+
+    response, elapsed, mock, client = asyncio.run(run())
+    assert response.status_code == 429
+    assert mock.requests == 3
+    assert client.retries == 2
+    assert elapsed >= 0.1
+
+
+def test_retry_after_longer_than_backoff_max_is_not_cut_short(make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0", rate_limit_rate=1.0, retry_after=LLM_BACKOFF_MAX + 10)
+        client = make_client(mock, max_retries=3)
+        return await client.post_messages(SINGLE), mock, client
+
+    response, mock, client = asyncio.run(run())
+    assert response.status_code == 429
+    assert mock.requests == 1
+    assert client.retries == 0
+
+
+def test_breaker_opens_and_fails_fast(make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0", error_rate=1.0)
+        client = make_client(mock)
+        client.breaker = CircuitBreaker(threshold=2, cooldown=60)
+        statuses = [(await client.post_messages(SINGLE)).status_code for _ in range(2)]
+        with pytest.raises(CircuitOpenError):
+            await client.post_messages(SINGLE)
+        return statuses, mock, client
+
+    statuses, mock, client = asyncio.run(run())
+    assert statuses == [529, 529]
+    assert mock.requests == 2
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_half_open_probe_releases_breaker(make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0", error_rate=1.0)
+        client = make_client(mock)
+        client.breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+        await client.post_messages(SINGLE)
+        assert client.breaker.state == CircuitBreaker.OPEN
+        await asyncio.sleep(0.06)
+
+        # The probe hangs and its caller goes away
+        mock.error_rate = 0.0
+        set_latency(mock, "fixed:5")
+        probe = asyncio.ensure_future(client.post_messages(SINGLE))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        set_latency(mock, "fixed:0")
+        return await client.post_messages(SINGLE), client
+
+    response, client = asyncio.run(run())
+    assert response.status_code == 200
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.parametrize("hedge_after, cancel_after, hedged", [(1.0, 0.05, 0), (0.01, 0.1, 1)])
+def test_cancel_stops_every_upstream_copy(hedge_after, cancel_after, hedged, make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0.5")
+        client = make_client(mock)
+        arm_hedging(client, SINGLE, hedge_after)
+        call = asyncio.ensure_future(client.post_messages(SINGLE))
+        await asyncio.sleep(cancel_after)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0.01)
+        # Checked inside the loop: asyncio.run() would cancel leftovers itself
+        assert client.hedged == hedged
+        assert client.in_flight == 0
+        assert mock.in_flight == 0
+        assert client._semaphore._value == client.max_concurrency
+
+    asyncio.run(run())
+
+
+def test_hedged_call_returns_first_success(make_client):
+    async def run():
+        mock = MockAnthropic()
+        # The primary is slow, the backup copy is fast
+        latencies = iter([0.5, 0.0])
+        mock.sample_latency = lambda rng: next(latencies)
+        client = make_client(mock)
+        arm_hedging(client, SINGLE, 0.01)
+        return await client.post_messages(SINGLE), client
+
+    response, client = asyncio.run(run())
+    assert response.status_code == 200
+    assert client.hedged == 1
+    assert client.hedge_wins == 1
+
+
+def test_failed_hedge_copy_waits_for_the_other_one(make_client):
+    async def run():
+        mock = MockAnthropic(error_rate=0.5)
+        # The primary is slow and succeeds, the backup is fast and gets a 529
+        latencies = iter([0.3, 0.0])
+        mock.sample_latency = lambda rng: next(latencies)
+        rolls = iter([0.0, 0.99])
+        mock.rng.random = lambda: next(rolls)
+        client = make_client(mock)
+        arm_hedging(client, SINGLE, 0.01)
+        return await client.post_messages(SINGLE), mock, client
+
+    response, mock, client = asyncio.run(run())
+    assert response.status_code == 200
+    assert mock.errors == 1
+    assert client.hedged == 1
+    assert client.hedge_wins == 0
+    assert client.breaker.failures == 0
+
+
+def test_hedge_returns_a_failed_response_only_when_every_copy_failed(make_client):
+    async def run():
+        mock = MockAnthropic(error_rate=1.0)
+        latencies = iter([0.3, 0.0])
+        mock.sample_latency = lambda rng: next(latencies)
+        client = make_client(mock)
+        arm_hedging(client, SINGLE, 0.01)
+        started = time.monotonic()
+        response = await client.post_messages(SINGLE)
+        return response, time.monotonic() - started, mock, client
+
+    response, elapsed, mock, client = asyncio.run(run())
+    assert response.status_code == 529
+    assert mock.errors == 2
+    assert elapsed >= 0.3
+    assert client.hedge_wins == 0
+
+
+def test_batch_calls_are_not_hedged_against_single_call_latency(make_client):
+    async def run():
+        mock = MockAnthropic("fixed:0.05")
+        client = make_client(mock)
+        arm_hedging(client, SINGLE, 0.001)
+        response = await client.post_messages(BATCH)
+        return response, client
+
+    response, client = asyncio.run(run())
+    assert response.status_code == 200
+    assert client.hedged == 0
+    assert request_shape(SINGLE) != request_shape(BATCH)
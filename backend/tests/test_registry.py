@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from registry import PersonaRegistry
+
+PERSONAS = [
+    {"id": 1, "age": 22, "state_primary": "sleep", "lifestyle": "biohacker", "city": "Київ",
+     "gender": "female", "cbd_experience": "none"},
+    {"id": 2, "age": 41, "state_primary": "stress", "lifestyle": "skeptic", "city": "Львів",
+     "gender": "male", "cbd_experience": "experienced"},
+]
+
+
+def test_scalar_and_list_values_select_personas():
+    registry = PersonaRegistry(PERSONAS)
+    assert registry.count({"state": "sleep"}) == 1
+    assert registry.count({"state": ["sleep", "stress"], "city": ["Львів"]}) == 1
+    assert list(registry.filter_indices({"age": ["35-44"]})) == [1]
+
+
+@pytest.mark.parametrize("values", [[["sleep"]], [{"a": 1}], {"a": 1}, [["sleep"], "stress"]])
+def test_unhashable_values_match_nothing(values):
+    registry = PersonaRegistry(PERSONAS)
+    expected = 1 if "stress" in values else 0
+    assert registry.count({"state": values}) == expected
+
+
+def test_malformed_segment_is_a_400_not_a_500(app_client):
+    async def run():
+        async with app_client() as client:
+            return await client.post("/api/test", json={"hypothesis": "x", "segments": {"state": [["a"]]}})
+
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No personas match filters"
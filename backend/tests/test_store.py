@@ -0,0 +1,92 @@
+import pytest
+
+from store import ResultStore, SQLiteResultStore, create_store, decode_cursor, encode_cursor
+
+
+def record(i: int, hypothesis: str = "Гіпотеза", created_at: str = None) -> dict:
+    return {
+        "id": f"test_{i:03d}",
+        "hypothesis": f"{hypothesis} {i}",
+        "created_at": created_at or f"2026-01-01T00:00:{i:02d}",
+        "results": {"type": "scale", "total": i},
+    }
+
+
+@pytest.fixture
+def store():
+    store = SQLiteResultStore(":memory:")
+    yield store
+    store.close()
+
+
+def pages(store, limit, q=None):
+    cursor, seen = None, []
+    while True:
+        page, cursor = store.list(limit=limit, cursor=cursor, q=q)
+        seen.append([r["id"] for r in page])
+        if cursor is None:
+            return seen
+
+
+def test_cursor_pages_cover_everything_newest_first(store):
+    for i in range(7):
+        store.add(record(i), [{"score": i}])
+
+    assert pages(store, 3) == [["test_006", "test_005", "test_004"],
+                               ["test_003", "test_002", "test_001"],
+                               ["test_000"]]
+    assert store.count() == 7
+
+
+def test_cursor_is_stable_with_equal_timestamps_and_new_inserts(store):
+    for i in range(4):
+        store.add(record(i, created_at="2026-01-01T00:00:00"), [])
+
+    first, cursor = store.list(limit=2)
+    store.add(record(9, created_at="2026-01-02T00:00:00"), [])
+    second, cursor = store.list(limit=2, cursor=cursor)
+
+    assert [r["id"] for r in first] == ["test_003", "test_002"]
+    assert [r["id"] for r in second] == ["test_001", "test_000"]
+    assert cursor is None
+
+
+def test_search_escapes_like_wildcards(store):
+    store.add(record(1, "Знижка 15%"), [])
+    store.add(record(2, "Знижка 150"), [])
+    store.add(record(3, "Підписка_річна"), [])
+    store.add(record(4, "Підписка річна"), [])
+
+    assert pages(store, 10, q="15%") == [["test_001"]]
+    assert pages(store, 10, q="_") == [["test_003"]]
+    assert pages(store, 1, q="Знижка") == [["test_002"], ["test_001"]]
+
+
+def test_list_returns_summaries_and_get_the_full_record(store):
+    store.add(record(1), [{"score": 8}], request={"hypothesis": "Гіпотеза 1"})
+
+    summary = store.list()[0][0]
+    full = store.get("test_001")
+    assert "responses" not in summary
+    assert full["responses"] == [{"score": 8}]
+    assert full["request"] == {"hypothesis": "Гіпотеза 1"}
+    assert full["results"] == summary["results"] == {"type": "scale", "total": 1}
+    assert store.get("missing") is None
+
+
+def test_cursor_round_trip_and_garbage():
+    assert decode_cursor(encode_cursor("2026-01-01T00:00:00", "test_1|x")) == ("2026-01-01T00:00:00", "test_1|x")
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+@pytest.mark.parametrize("url", ["postgresql://localhost/db", "postgres://localhost/db", "mysql://x", "results.db"])
+def test_unsupported_urls_are_rejected(url):
+    with pytest.raises(ValueError, match="Unsupported RESULT_STORE_URL"):
+        create_store(url)
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ResultStore()
+    assert isinstance(create_store("sqlite:///:memory:"), SQLiteResultStore)
@@ -0,0 +1,139 @@
+"""
+Per-request stage spans and structured (JSON) logging
+"""
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterator
+
+from metrics import STAGE_SECONDS
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+
+logger = logging.getLogger("focus_group")
+
+_RECORD_FIELDS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class StageStats:
+    """All spans of one stage within a trace: count, summed and max duration, wall-clock extent"""
+
+    __slots__ = ("count", "total", "max", "first_start", "last_end")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.first_start = float("inf")
+        self.last_end = 0.0
+
+    def add(self, start: float, end: float):
+        duration = end - start
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.first_start = min(self.first_start, start)
+        self.last_end = max(self.last_end, end)
+
+
+class Trace:
+    """Spans of one request, aggregated per stage.
+
+    Stages that run once (filter, aggregate, store) have count 1; per-persona
+    stages (persona_call, upstream, parse) are summed, so memory does not
+    grow with the number of personas. start_ms/end_ms are offsets from the
+    start of the trace; with concurrent calls total_ms exceeds end_ms - start_ms.
+    """
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages: Dict[str, StageStats] = {}
+
+    def record(self, stage: str, start: float, end: float):
+        stats = self.stages.get(stage)
+        if stats is None:
+            stats = self.stages[stage] = StageStats()
+        stats.add(start - self.started, end - self.started)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def timings(self) -> Dict[str, Any]:
+        def ms(seconds: float) -> float:
+            return round(seconds * 1000, 3)
+
+        return {
+            "trace_id": self.id,
+            "total_ms": ms(self.elapsed()),
+            "stages": {
+                stage: {"count": s.count, "total_ms": ms(s.total), "max_ms": ms(s.max),
+                        "start_ms": ms(s.first_start), "end_ms": ms(s.last_end)}
+                for stage, s in self.stages.items()
+            },
+        }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace(name: str) -> Trace:
+    """Trace the request running in this context (tasks it spawns inherit it)"""
+    trace = Trace(name)
+    current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a stage into the stage histogram and the current trace, if any"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        STAGE_SECONDS.observe(end - start, stage=stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.record(stage, start, end)
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; `extra` fields and the trace id are top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        trace = current_trace.get()
+        if trace is not None:
+            entry["trace_id"] = trace.id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False